@@ -0,0 +1,7 @@
+"""Бенчмарки приложения posts.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.run --posts 2000 --output results/before.json
+    python -m benchmarks.compare results/before.json results/after.json
+"""
@@ -0,0 +1,41 @@
+"""Сравнение двух прогонов benchmarks.run по сценариям."""
+import argparse
+import json
+from pathlib import Path
+
+METRICS = ('p50_ms', 'p99_ms', 'queries_per_request', 'peak_alloc_kb')
+
+
+def compare(before, after):
+    """Строки таблицы: сценарий, метрика, было, стало, изменение в %."""
+    rows = []
+    for name, old in before['scenarios'].items():
+        new = after['scenarios'].get(name)
+        if new is None:
+            continue
+        for metric in METRICS:
+            if old.get(metric) is None or new.get(metric) is None:
+                continue
+            change = None
+            if old[metric]:
+                change = (new[metric] - old[metric]) / old[metric] * 100
+            rows.append((name, metric, old[metric], new[metric], change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.compare', description=__doc__)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args(argv)
+    before = json.loads(Path(args.before).read_text())
+    after = json.loads(Path(args.after).read_text())
+    print(f'{before["commit"]} -> {after["commit"]}')
+    for name, metric, old, new, change in compare(before, after):
+        change = '' if change is None else f'{change:+.1f}%'
+        print(f'{name:>14} {metric:>20} {old:>10} {new:>10} {change:>8}')
+
+
+if __name__ == '__main__':
+    main()
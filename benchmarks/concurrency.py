@@ -0,0 +1,175 @@
+"""Конкурентная нагрузка на SQLite: чтения вперемешку с записью.
+
+Несколько потоков одновременно вызывают WSGI-приложение: читают ленту и
+страницы постов, пишут комментарии и посты. Прогон делается дважды на
+одной базе — со штатными настройками SQLite (журнал отката, без очереди
+на запись) и с настройками core.db.sqlite3 из settings (WAL, PRAGMA,
+очередь на запись), — и сравнивается пропускная способность, задержки и
+число ответов 500 («database is locked»).
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .environment import setup_django
+from .run import RESULTS_DIR, git_commit, percentile
+
+MODES = ('baseline', 'tuned')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.concurrency',
+        description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='файл базы; без него — временный')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100,
+                        help='запросов на поток')
+    parser.add_argument('--write-ratio', type=float, default=0.3,
+                        help='доля пишущих запросов')
+    parser.add_argument('--mode', action='append', choices=MODES,
+                        help='прогнать только эти режимы')
+    parser.add_argument('--output', help='куда записать JSON')
+    return parser.parse_args(argv)
+
+
+def configure(mode, tuned):
+    """Переключает настройки default и закрывает открытые соединения."""
+    from django.db import connections
+
+    settings_dict = connections['default'].settings_dict
+    if mode == 'tuned':
+        settings_dict.update(tuned)
+    else:
+        # WAL сохраняется в файле базы, поэтому журнал возвращается явно
+        settings_dict.update(
+            PRAGMAS={'journal_mode': 'delete'}, SERIALIZE_WRITES=False)
+    connections.close_all()
+    with connections['default'].cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal = cursor.fetchone()[0]
+    connections.close_all()
+    return journal
+
+
+def worker(app, user, post_ids, args, rng, barrier, samples):
+    from .client import WSGIClient
+
+    client = WSGIClient(app)
+    client.login(user)
+    csrf = client.csrf_token('/create/')
+    barrier.wait()
+    for number in range(args.requests):
+        writes = rng.random() < args.write_ratio
+        post_id = rng.choice(post_ids)
+        started = time.perf_counter()
+        if not writes:
+            url = '/' if number % 2 else f'/posts/{post_id}/'
+            status, _, _ = client.get(url)
+        elif number % 2:
+            status, _, _ = client.post(f'/posts/{post_id}/comment', {
+                'text': 'Комментарий под нагрузкой',
+                'csrfmiddlewaretoken': csrf,
+            })
+        else:
+            status, _, _ = client.post('/create/', {
+                'text': 'Пост под нагрузкой', 'csrfmiddlewaretoken': csrf,
+            })
+        samples.append(
+            (writes, status, (time.perf_counter() - started) * 1000))
+
+
+def run_mode(app, args):
+    from django.db import connections
+
+    from posts.models import Post, User
+
+    users = list(User.objects.order_by('?')[:args.threads])
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    connections.close_all()
+    barrier = threading.Barrier(args.threads + 1)
+    samples = []
+    threads = [
+        threading.Thread(target=worker, args=(
+            app, users[number % len(users)], post_ids, args,
+            random.Random(args.seed + number), barrier, samples))
+        for number in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    result = {
+        'requests': len(samples),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(samples) / elapsed, 1),
+        'errors': sum(status >= 500 for _, status, _ in samples),
+    }
+    for kind, writes in (('read', False), ('write', True)):
+        timings = [ms for write, _, ms in samples if write == writes]
+        if timings:
+            result[f'{kind}_p50_ms'] = round(percentile(timings, 50), 3)
+            result[f'{kind}_p99_ms'] = round(percentile(timings, 99), 3)
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    database = args.db or Path(tempfile.mkdtemp()) / 'bench.sqlite3'
+    if setup_django(database):
+        from .seed import seed
+        seed(users=args.users, posts=args.posts, comments=args.posts,
+             random_seed=args.seed)
+
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+
+    settings_dict = connections['default'].settings_dict
+    tuned = {
+        'PRAGMAS': dict(settings_dict.get('PRAGMAS', {})),
+        'SERIALIZE_WRITES': settings_dict.get('SERIALIZE_WRITES', False),
+    }
+    app = get_wsgi_application()
+    # ожидание блокировок под нагрузкой заполнило бы вывод медленными запросами
+    logging.getLogger('yatube.slow_queries').setLevel(logging.ERROR)
+    results = {}
+    for mode in args.mode or MODES:
+        journal = configure(mode, tuned)
+        results[mode] = dict(run_mode(app, args), journal_mode=journal)
+        print(f'{mode:>9} ({journal}): '
+              f'{results[mode]["requests_per_second"]:7.1f} req/s  '
+              f'ошибок {results[mode]["errors"]:4}  '
+              f'write p99 {results[mode].get("write_p99_ms", 0):8.1f} ms  '
+              f'read p99 {results[mode].get("read_p99_ms", 0):8.1f} ms',
+              file=sys.stderr)
+    report = {
+        'commit': git_commit(),
+        'database': str(database),
+        'options': {
+            key: value for key, value in vars(args).items()
+            if key not in ('output', 'db')
+        },
+        'modes': results,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f'{report["commit"]}-concurrency.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f'Результаты записаны в {output}', file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Подготовка Django для бенчмарков: путь к проекту и отдельная БД.
+
+Бенчмарк не трогает рабочую db.sqlite3: база создаётся в указанном файле
+по моделям, без миграций (их в репозитории нет), так же как pytest
+запускается с --nomigrations.
+"""
+import os
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent / 'yatube'
+
+
+class DisableMigrations:
+    def __contains__(self, app_label):
+        return True
+
+    def __getitem__(self, app_label):
+        return None
+
+
+def setup_django(database, settings_module='yatube.settings'):
+    """Настраивает Django на базу database и создаёт в ней таблицы.
+
+    Возвращает True, если база создана заново и её нужно наполнить.
+    """
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    from django.conf import settings
+
+    for alias in ('default', 'replica'):
+        if alias in settings.DATABASES:
+            settings.DATABASES[alias]['NAME'] = str(database)
+    settings.MIGRATION_MODULES = DisableMigrations()
+    settings.DEBUG = False
+    # фоновые задачи выполняются сразу, чтобы их цена попадала в замер
+    settings.BACKGROUND_TASKS_ASYNC = False
+    # письма уведомлений собираются, но никуда не пишутся
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.dummy.EmailBackend'
+    created = not Path(database).exists()
+    django.setup()
+    if created:
+        from django.core.management import call_command
+        call_command('migrate', run_syncdb=True, verbosity=0)
+    return created
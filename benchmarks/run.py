@@ -0,0 +1,206 @@
+"""Нагрузочный прогон основных страниц posts через WSGI-приложение.
+
+Для каждого сценария делается несколько прогревочных запросов, затем
+--requests замеров: время ответа, число SQL-запросов и пик выделенной
+памяти (tracemalloc, на части запросов — он сильно замедляет работу).
+Итог пишется в JSON вместе с коммитом, на котором сделан прогон.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .environment import setup_django
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+SCENARIOS = (
+    'index', 'group_posts', 'profile', 'follow_index', 'post_detail',
+    'add_comment',
+)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True, cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run', description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='файл базы; без него — временный')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--follows', type=int, default=300)
+    parser.add_argument('--comments', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='замеров на сценарий')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--memory-samples', type=int, default=20)
+    parser.add_argument('--proxy', action='store_true',
+                        help='пропускать запросы через CachingProxy')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='прогнать только эти сценарии')
+    parser.add_argument('--output', help='куда записать JSON')
+    return parser.parse_args(argv)
+
+
+class Bench:
+    """Готовит клиентов и запросы сценариев на засеянной базе."""
+
+    def __init__(self, app, rng):
+        from posts.models import Follow, Group, Post, User
+
+        from .client import WSGIClient
+
+        self.rng = rng
+        self.anonymous = WSGIClient(app)
+        reader = User.objects.filter(
+            pk__in=Follow.objects.values('user')).first()
+        self.reader = WSGIClient(app)
+        self.reader.login(reader or User.objects.first())
+        self.group_slugs = list(Group.objects.values_list('slug', flat=True))
+        self.usernames = list(User.objects.values_list('username', flat=True))
+        self.post_ids = list(Post.objects.values_list('id', flat=True))
+        self.csrf = None
+
+    def index(self):
+        return self.anonymous.get('/')
+
+    def group_posts(self):
+        return self.anonymous.get(
+            f'/group/{self.rng.choice(self.group_slugs)}/')
+
+    def profile(self):
+        return self.anonymous.get(
+            f'/profile/{self.rng.choice(self.usernames)}/')
+
+    def follow_index(self):
+        return self.reader.get('/follow/')
+
+    def post_detail(self):
+        return self.anonymous.get(f'/posts/{self.rng.choice(self.post_ids)}/')
+
+    def add_comment(self):
+        post_id = self.rng.choice(self.post_ids)
+        if self.csrf is None:
+            self.csrf = self.reader.csrf_token(f'/posts/{post_id}/')
+        return self.reader.post(f'/posts/{post_id}/comment', {
+            'text': 'Комментарий из бенчмарка',
+            'csrfmiddlewaretoken': self.csrf,
+        })
+
+
+def measure(bench, name, requests, warmup, memory_samples):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    scenario = getattr(bench, name)
+    for _ in range(warmup):
+        scenario()
+    timings, queries, statuses = [], [], set()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            status, _, _ = scenario()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        statuses.add(status)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(memory_samples):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            scenario()
+            peak = tracemalloc.get_traced_memory()[1]
+            peaks.append((peak - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+    return {
+        'requests': requests,
+        'statuses': sorted(statuses),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+        'peak_alloc_kb': round(statistics.median(peaks), 1) if peaks else None,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    database = args.db or Path(tempfile.mkdtemp()) / 'bench.sqlite3'
+    created = setup_django(database)
+    sizes = None
+    if created:
+        from .seed import seed
+        started = time.perf_counter()
+        sizes = seed(args.users, args.groups, args.posts, args.follows,
+                     args.comments, args.seed)
+        print(f'База наполнена за {time.perf_counter() - started:.1f} с: '
+              f'{sizes}', file=sys.stderr)
+
+    from django.core.wsgi import get_wsgi_application
+
+    from core.http_cache import CachingProxy
+
+    app = get_wsgi_application()
+    if args.proxy:
+        app = CachingProxy(app)
+    bench = Bench(app, random.Random(args.seed))
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = measure(
+            bench, name, args.requests, args.warmup, args.memory_samples)
+        print(f'{name:>14}: p50 {results[name]["p50_ms"]:8.2f} ms  '
+              f'p99 {results[name]["p99_ms"]:8.2f} ms  '
+              f'queries {results[name]["queries_per_request"]:6.2f}',
+              file=sys.stderr)
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'database': str(database),
+        'seed_sizes': sizes,
+        'options': {
+            key: value for key, value in vars(args).items()
+            if key not in ('output', 'db')
+        },
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'scenarios': results,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f'{report["commit"]}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f'Результаты записаны в {output}', file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
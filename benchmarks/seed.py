@@ -0,0 +1,48 @@
+"""Наполнение базы бенчмарка данными заданного объёма через mixer/Faker."""
+import random
+
+from django.db import transaction
+from faker import Faker
+from mixer.backend.django import Mixer
+
+
+def seed(users=50, groups=10, posts=2000, follows=300, comments=2000,
+         random_seed=0):
+    """Создаёт пользователей, группы, посты, подписки и комментарии.
+
+    Всё создаётся обычным save(), поэтому сигналы заполняют ленты,
+    счётчики и поисковый индекс так же, как в работающем приложении.
+    """
+    from posts.models import Comment, Follow, Group, Post, User
+
+    Faker.seed(random_seed)
+    rng = random.Random(random_seed)
+    mixer = Mixer(locale='ru')
+    with transaction.atomic():
+        authors = mixer.cycle(users).blend(
+            User, username=(f'user{number}' for number in range(users)),
+            first_name=mixer.faker.first_name,
+            last_name=mixer.faker.last_name)
+        group_list = mixer.cycle(groups).blend(
+            Group, slug=(f'group-{number}' for number in range(groups)),
+            title=mixer.faker.catch_phrase,
+            description=mixer.faker.sentence)
+        pairs = [
+            (user, author) for user in authors for author in authors
+            if user != author
+        ]
+        for user, author in rng.sample(pairs, min(follows, len(pairs))):
+            Follow.objects.create(user=user, author=author)
+        post_list = mixer.cycle(posts).blend(
+            Post, text=mixer.faker.text,
+            author=(rng.choice(authors) for _ in range(posts)),
+            group=(rng.choice(group_list + [None]) for _ in range(posts)),
+            image='')
+        mixer.cycle(comments).blend(
+            Comment, text=mixer.faker.sentence,
+            post=(rng.choice(post_list) for _ in range(comments)),
+            author=(rng.choice(authors) for _ in range(comments)))
+    return {
+        'users': users, 'groups': groups, 'posts': posts,
+        'follows': min(follows, len(pairs)), 'comments': comments,
+    }
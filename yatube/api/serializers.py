@@ -0,0 +1,53 @@
+"""Компактное JSON-представление постов и комментариев.
+
+Сериализаторы читают только поля, которые выбирают for_feed и for_post,
+поэтому не делают дополнительных запросов.
+"""
+from posts.thumbnails import THUMBNAIL_SIZES, thumbnail
+
+
+def serialize_author(user):
+    return {
+        'username': user.username,
+        'name': user.get_full_name(),
+    }
+
+
+def serialize_image(post):
+    if not post.image:
+        return None
+    thumbnails = {}
+    for size in THUMBNAIL_SIZES:
+        prepared = thumbnail(post, size)
+        if prepared is not None:
+            thumbnails[size] = prepared.url
+    return {
+        'url': post.image.url,
+        'width': post.image_width,
+        'height': post.image_height,
+        'thumbnails': thumbnails,
+    }
+
+
+def serialize_post(post):
+    group = None
+    if post.group_id is not None:
+        group = {'slug': post.group.slug, 'title': post.group.title}
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': serialize_author(post.author),
+        'group': group,
+        'image': serialize_image(post),
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': serialize_author(comment.author),
+    }
@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group)
+            for number in range(12)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_return_cursor_pages(self):
+        """Ленты отдают по 10 постов и ссылку на следующую страницу"""
+        urls = (
+            reverse('api:post_list'),
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('api:user_posts', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['id'], self.post.pk)
+                second = self.client.get(data['next']).json()
+                self.assertEqual(len(second['results']), 2)
+                self.assertIsNone(second['next'])
+
+    def test_post_serializer(self):
+        """Пост сериализуется с автором, группой и счётчиком комментариев"""
+        data = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        ).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(
+            data['author'], {'username': 'author', 'name': 'Лев Толстой'})
+        self.assertEqual(data['group'], {'slug': 'group', 'title': 'Группа'})
+        self.assertEqual(data['comments_count'], 1)
+        self.assertIsNone(data['image'])
+
+    def test_comments(self):
+        data = self.client.get(
+            reverse('api:comment_list', kwargs={'post_id': self.post.pk})
+        ).json()
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+        self.assertEqual(data['results'][0]['author']['username'], 'reader')
+
+    def test_follow_feed_requires_login(self):
+        url = reverse('api:follow_feed')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 10)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_if_none_match_returns_304(self):
+        """Совпавший ETag даёт 304 без тела, а правка поста меняет ETag и не
+        прячется за If-Modified-Since"""
+        url = reverse('api:post_list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый текст'})
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        # дата публикации не меняется при правке и не даёт ложного 304
+        edited = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Tue, 01 Jan 2999 00:00:00 GMT')
+        self.assertEqual(edited.status_code, 200)
+
+    def test_new_comment_changes_detail_etag(self):
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Ещё комментарий'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 2)
@@ -0,0 +1,132 @@
+"""Версионированный JSON API лент и постов только для чтения.
+
+Каждый ответ несёт сильный ETag. ETag страницы ленты собирается из версий
+карточек её постов (posts.cards) и курсоров соседних страниц, так что он
+меняется при правке поста, новом комментарии или переименовании автора.
+На совпавший If-None-Match API отвечает 304, не сериализуя ни одного
+поста. Last-Modified не отдаётся: у постов нет даты правки, а по дате
+публикации If-Modified-Since отвечал бы 304 на изменённую страницу.
+"""
+import hashlib
+import json
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+from posts.cards import attach_card_versions
+from posts.models import Comment, FeedItem, Group, Post, User
+from posts.utils import (FEED_ORDERING, POSTS_PER_PAGE_10, TIMELINE_ORDERING,
+                         CursorPaginator)
+
+from .serializers import serialize_comment, serialize_post
+
+COMMENTS_ORDERING = ('created', 'id')
+
+
+def _etag(*parts):
+    payload = json.dumps(parts, default=str).encode()
+    return quote_etag(hashlib.sha1(payload).hexdigest())
+
+
+def _link(request, cursor):
+    return f'{request.path}?cursor={cursor}' if cursor else None
+
+
+def _conditional(request, etag, build, private=False):
+    """Отвечает 304 по If-None-Match или JSON из build()."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(
+            build(), json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    # кэш может хранить ответ, но обязан перепроверять его при каждом запросе
+    patch_cache_control(
+        response, no_cache=True, **{'private' if private else 'public': True})
+    return response
+
+
+def _paginate(request, object_list, ordering):
+    paginator = CursorPaginator(object_list, POSTS_PER_PAGE_10, ordering)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return paginator, list(page_obj)
+
+
+def _feed_response(request, posts, private=False):
+    """Страница ленты; posts — посты или записи ленты подписок."""
+    ordering = FEED_ORDERING
+    if posts.model is FeedItem:
+        ordering = TIMELINE_ORDERING
+    paginator, items = _paginate(request, posts, ordering)
+    page = attach_card_versions(
+        item.post if isinstance(item, FeedItem) else item for item in items)
+    etag = _etag(
+        [(post.pk, post.card_version) for post in page],
+        paginator.next_cursor, paginator.previous_cursor)
+
+    def build():
+        return {
+            'results': [serialize_post(post) for post in page],
+            'next': _link(request, paginator.next_cursor),
+            'previous': _link(request, paginator.previous_cursor),
+        }
+
+    return _conditional(request, etag, build, private)
+
+
+@require_safe
+def post_list(request):
+    return _feed_response(request, Post.objects.for_feed())
+
+
+@require_safe
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed_response(request, group.related_posts_in_group.for_feed())
+
+
+@require_safe
+def user_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return _feed_response(
+        request, author.related_author_of_posts.for_feed())
+
+
+@require_safe
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Нужна авторизация'}, status=401,
+            json_dumps_params={'ensure_ascii': False})
+    return _feed_response(
+        request, FeedItem.objects.for_feed(request.user), private=True)
+
+
+@require_safe
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    attach_card_versions([post])
+    return _conditional(
+        request, _etag(post.pk, post.card_version),
+        lambda: serialize_post(post))
+
+
+@require_safe
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    paginator, comments = _paginate(
+        request, Comment.objects.for_post(post), COMMENTS_ORDERING)
+    etag = _etag(
+        [(comment.pk, serialize_comment(comment)['author'])
+         for comment in comments],
+        paginator.next_cursor, paginator.previous_cursor)
+
+    def build():
+        return {
+            'results': [serialize_comment(comment) for comment in comments],
+            'next': _link(request, paginator.next_cursor),
+            'previous': _link(request, paginator.previous_cursor),
+        }
+
+    return _conditional(request, etag, build)
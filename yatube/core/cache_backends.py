@@ -0,0 +1,60 @@
+"""Бэкенды кэша Django, считающие попадания и промахи.
+
+Это обычные бэкенды с примесью InstrumentedCacheMixin: get и get_many
+дописывают попадания и промахи в замеры текущего запроса
+(core.metrics). Вне запроса и во вложенных вызовах (get_many базового
+класса перебирает get) ничего не считается.
+"""
+from django.core.cache.backends import filebased, locmem, memcached
+
+from .metrics import current
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+
+    def get(self, key, default=None, version=None):
+        metrics = current()
+        if metrics is None or metrics.cache_depth:
+            return super().get(key, default, version)
+        metrics.cache_depth += 1
+        try:
+            value = super().get(key, _MISSING, version)
+        finally:
+            metrics.cache_depth -= 1
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None):
+        metrics = current()
+        if metrics is None or metrics.cache_depth:
+            return super().get_many(keys, version)
+        keys = list(keys)
+        metrics.cache_depth += 1
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            metrics.cache_depth -= 1
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+class LocMemCache(InstrumentedCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(InstrumentedCacheMixin, filebased.FileBasedCache):
+    pass
+
+
+class MemcachedCache(InstrumentedCacheMixin, memcached.MemcachedCache):
+    pass
+
+
+class PyLibMCCache(InstrumentedCacheMixin, memcached.PyLibMCCache):
+    pass
@@ -0,0 +1,166 @@
+"""Минимальный сервер с текстовым протоколом memcached.
+
+Нужен там, где настоящего memcached нет: в тестах и при локальном запуске
+нескольких воркеров. Все процессы, настроенные на один адрес, видят один
+и тот же кэш, как и в продакшене. Поддерживает команды, которыми
+пользуется django.core.cache.backends.memcached.MemcachedCache.
+"""
+import socketserver
+import threading
+import time
+
+# Срок больше 30 дней memcached трактует как абсолютный unix timestamp
+RELATIVE_EXPIRE_LIMIT = 60 * 60 * 24 * 30
+STORAGE_COMMANDS = {'set', 'add', 'replace', 'append', 'prepend'}
+
+
+class MemcachedStandIn(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.lock = threading.Lock()
+        self.data = {}
+        self._thread = None
+
+    @property
+    def location(self):
+        host, port = self.server_address[:2]
+        return f'{host}:{port}'
+
+    def start(self):
+        """Запускает сервер в фоновом потоке и возвращает его же."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def expires_at(self, exptime):
+        exptime = int(exptime)
+        if exptime == 0:
+            return None
+        if exptime < 0:
+            return 0
+        if exptime > RELATIVE_EXPIRE_LIMIT:
+            return exptime
+        return time.time() + exptime
+
+    def lookup(self, key):
+        """Возвращает (flags, value) или None; вызывать под self.lock."""
+        item = self.data.get(key)
+        if item is None:
+            return None
+        flags, value, expires = item
+        if expires is not None and expires <= time.time():
+            del self.data[key]
+            return None
+        return flags, value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode('utf-8', 'replace').split()
+            if not parts:
+                continue
+            command, args = parts[0].lower(), parts[1:]
+            noreply = bool(args) and args[-1] == 'noreply'
+            if noreply:
+                args = args[:-1]
+            if command == 'quit':
+                return
+            if command in STORAGE_COMMANDS:
+                value = self.rfile.read(int(args[3]) + 2)[:-2]
+                reply = self.store(command, args, value)
+            else:
+                method = getattr(self, f'do_{command}', None)
+                reply = method(args) if method else b'ERROR\r\n'
+            if not noreply:
+                self.wfile.write(reply)
+
+    def store(self, command, args, value):
+        key, flags, exptime = args[0], int(args[1]), args[2]
+        server = self.server
+        with server.lock:
+            current = server.lookup(key)
+            if command == 'add' and current is not None:
+                return b'NOT_STORED\r\n'
+            if command in ('replace', 'append', 'prepend') and current is None:
+                return b'NOT_STORED\r\n'
+            if command == 'append':
+                flags, value = current[0], current[1] + value
+            elif command == 'prepend':
+                flags, value = current[0], value + current[1]
+            server.data[key] = (flags, value, server.expires_at(exptime))
+        return b'STORED\r\n'
+
+    def do_get(self, keys):
+        chunks = []
+        with self.server.lock:
+            for key in keys:
+                item = self.server.lookup(key)
+                if item is not None:
+                    flags, value = item
+                    chunks.append(
+                        f'VALUE {key} {flags} {len(value)}\r\n'.encode()
+                        + value + b'\r\n')
+        chunks.append(b'END\r\n')
+        return b''.join(chunks)
+
+    do_gets = do_get
+
+    def do_delete(self, args):
+        with self.server.lock:
+            if self.server.lookup(args[0]) is None:
+                return b'NOT_FOUND\r\n'
+            del self.server.data[args[0]]
+        return b'DELETED\r\n'
+
+    def do_incr(self, args, sign=1):
+        key, delta = args[0], int(args[1])
+        with self.server.lock:
+            item = self.server.lookup(key)
+            if item is None:
+                return b'NOT_FOUND\r\n'
+            flags, value = item
+            try:
+                number = max(int(value) + sign * delta, 0)
+            except ValueError:
+                return (b'CLIENT_ERROR cannot increment or decrement '
+                        b'non-numeric value\r\n')
+            expires = self.server.data[key][2]
+            self.server.data[key] = (flags, str(number).encode(), expires)
+        return f'{number}\r\n'.encode()
+
+    def do_decr(self, args):
+        return self.do_incr(args, sign=-1)
+
+    def do_touch(self, args):
+        with self.server.lock:
+            item = self.server.lookup(args[0])
+            if item is None:
+                return b'NOT_FOUND\r\n'
+            self.server.data[args[0]] = (
+                *item, self.server.expires_at(args[1]))
+        return b'TOUCHED\r\n'
+
+    def do_flush_all(self, args):
+        with self.server.lock:
+            self.server.data.clear()
+        return b'OK\r\n'
+
+    def do_version(self, args):
+        return b'VERSION yatube-standin\r\n'
+
+    def do_stats(self, args):
+        with self.server.lock:
+            items = len(self.server.data)
+        return f'STAT curr_items {items}\r\nEND\r\n'.encode()
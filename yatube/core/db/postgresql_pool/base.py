@@ -0,0 +1,57 @@
+"""PostgreSQL с пулом соединений psycopg2 внутри процесса.
+
+Штатный бэкенд держит по соединению на поток и по истечении
+CONN_MAX_AGE закрывает его, а следующий запрос снова платит за
+подключение. Этот бэкенд берёт соединения из общего для процесса
+ThreadedConnectionPool и возвращает их туда вместо закрытия, так что
+подключений к серверу не больше POOL_SIZE, а установка соединения не
+повторяется. POOL_SIZE должен быть не меньше числа потоков воркера:
+ThreadedConnectionPool не ждёт освобождения, а бросает PoolError.
+"""
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+DEFAULT_POOL_SIZE = 10
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def get_pool(self, conn_params):
+        with self._pools_lock:
+            connection_pool = self._pools.get(self.alias)
+            if connection_pool is None:
+                size = self.settings_dict.get('POOL_SIZE') or DEFAULT_POOL_SIZE
+                connection_pool = pool.ThreadedConnectionPool(
+                    1, size, **conn_params)
+                self._pools[self.alias] = connection_pool
+        return connection_pool
+
+    def get_new_connection(self, conn_params):
+        connection_pool = self.get_pool(conn_params)
+        connection = connection_pool.getconn()
+        if connection.closed:
+            connection_pool.putconn(connection, close=True)
+            connection = connection_pool.getconn()
+        # прежний владелец мог оставить открытую транзакцию или autocommit
+        connection.reset()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection_pool = self._pools.get(self.alias)
+        with self.wrap_database_errors:
+            if connection_pool is None:
+                return self.connection.close()
+            # сломанное соединение пул закрывает, а не отдаёт следующему
+            connection_pool.putconn(
+                self.connection, close=bool(self.connection.closed))
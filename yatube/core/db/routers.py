@@ -0,0 +1,71 @@
+"""Маршрутизация запросов к БД между основной базой и репликами.
+
+Пишет приложение всегда в default. Читать с реплик разрешено только
+внутри view, помеченных read_from_replica, — это ленты и страницы постов,
+где небольшое отставание реплики не страшно. Чтобы автор сразу увидел
+свой пост, комментарий или подписку, view с записью помечаются
+stick_to_primary: после успешной записи (такие view отвечают редиректом)
+они ставят cookie, и на REPLICA_STICKY_SECONDS все чтения этого клиента
+идут в основную базу.
+
+Реплика выбирается один раз на запрос и хранится в контекстной
+переменной: все чтения view видят одно и то же состояние данных, а не
+смесь реплик с разным отставанием.
+"""
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+
+# Реплика, выбранная для текущего запроса; None — читать из default
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+def is_sticky(request):
+    return settings.REPLICA_STICKY_COOKIE in request.COOKIES
+
+
+def read_from_replica(view):
+    """Пускает чтения view на реплику, если клиент не привязан к default."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD') or is_sticky(request)
+                or not settings.DATABASE_REPLICAS):
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+def stick_to_primary(view):
+    """После записи привязывает клиента к default на время отставания."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code in (301, 302, 303):
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _replica.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же данные, что и в default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,126 @@
+"""SQLite для небольших установок: WAL, настройки соединения и очередь записи.
+
+Каждое новое соединение получает PRAGMA из ключа PRAGMAS настроек базы:
+WAL, synchronous=NORMAL, mmap и размер кэша страниц. В режиме WAL чтение
+не блокирует запись и наоборот, но писатель у SQLite по-прежнему один, и
+конкурирующие транзакции получают «database is locked». Поэтому при
+SERIALIZE_WRITES запись внутри процесса встаёт в очередь на общую для
+всех потоков блокировку алиаса базы: одиночные INSERT/UPDATE/DELETE
+держат её на время запроса, транзакции — от первого пишущего запроса до
+COMMIT или ROLLBACK. Чтения блокировку не берут, в том числе блоки atomic,
+которые только читают: транзакция начинается обычным отложенным BEGIN.
+Между процессами запись ждёт busy_timeout.
+
+Транзакция, которая сначала читала, а потом стала писать, в WAL может
+получить «database is locked» сразу, без ожидания: её снимок данных
+устарел, если между первым чтением и записью кто-то успел зафиксировать
+свою. Такую транзакцию нужно повторить.
+"""
+import re
+import threading
+from contextlib import contextmanager
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+WRITE_RE = re.compile(
+    r'\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+PRAGMA_NAME_RE = re.compile(r'^\w+$')
+DEFAULT_WRITE_TIMEOUT = 5
+
+
+class CursorWrapper(base.SQLiteCursorWrapper):
+
+    def execute(self, query, params=None):
+        with self.database.writing(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self.database.writing(query):
+            return super().executemany(query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _write_locks = {}
+    _write_locks_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._holds_write_lock = False
+
+    @property
+    def serializes_writes(self):
+        # тестовая база в памяти делит кэш между соединениями, и две
+        # пишущие транзакции к ней из одного потока (default и реплика)
+        # не уживаются
+        return (self.settings_dict.get('SERIALIZE_WRITES', False)
+                and not self.is_in_memory_db())
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            if not PRAGMA_NAME_RE.match(name):
+                raise ValueError(f'Недопустимое имя PRAGMA: {name}')
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.database = self
+        return cursor
+
+    def _write_lock(self):
+        with self._write_locks_lock:
+            return self._write_locks.setdefault(self.alias, threading.Lock())
+
+    def acquire_write_lock(self):
+        if self._holds_write_lock or not self.serializes_writes:
+            return
+        timeout = self.settings_dict['OPTIONS'].get(
+            'timeout', DEFAULT_WRITE_TIMEOUT)
+        if not self._write_lock().acquire(timeout=timeout):
+            raise OperationalError(
+                'database is locked: очередь на запись не дошла '
+                f'за {timeout} с')
+        self._holds_write_lock = True
+
+    def release_write_lock(self):
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            self._write_lock().release()
+
+    @contextmanager
+    def writing(self, query):
+        """Встаёт в очередь на запись перед пишущим запросом.
+
+        Вне транзакции блокировка отпускается после запроса, в транзакции
+        держится до COMMIT или ROLLBACK.
+        """
+        if (self._holds_write_lock or not self.serializes_writes
+                or not WRITE_RE.match(query)):
+            yield
+            return
+        self.acquire_write_lock()
+        try:
+            yield
+        finally:
+            if self.get_autocommit():
+                self.release_write_lock()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
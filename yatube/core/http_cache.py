@@ -0,0 +1,211 @@
+"""Кэш целых HTTP-ответов для анонимных посетителей с очисткой по тегам.
+
+View помечает ответ тегами (surrogate keys) в заголовке Surrogate-Key:
+id показанных постов, группа, автор. Обратный прокси CachingProxy
+хранит такие ответы в общем кэше Django и отдаёт их анонимным
+GET-запросам, не пуская запрос в Django вовсе: ни сессий, ни
+аутентификации, ни шаблонов. Когда данные меняются, view вызывает
+purge() с тегами, и все ответы с этими тегами перестают быть актуальными.
+
+Очистка устроена так же, как версии карточек в posts.cards: у каждого
+тега в кэше лежит версия, сохранённый ответ помнит версии своих тегов, а
+purge() просто заводит тегу новую версию. Перебирать ключи не нужно, и
+это работает с любым бэкендом кэша, в том числе общим для нескольких
+процессов.
+
+Версии тегов известны только после рендеринга, а purge() может случиться
+и во время него — тогда уже прочитанные view данные устарели, а версии
+новые. Поэтому purge() ещё и увеличивает общий счётчик очисток: прокси
+читает его до вызова приложения и не сохраняет ответ, если счётчик
+за это время изменился.
+
+Локально прокси запускается командой `python manage.py http_cache_proxy`
+перед обычным сервером приложения.
+"""
+import hashlib
+import http.client
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import caches
+
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+PURGE_SEQUENCE_KEY = 'surrogate_key_purges'
+# Заголовки одного соединения, которые прокси не передаёт дальше
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade',
+}
+UNCACHEABLE_DIRECTIVES = ('private', 'no-store')
+
+
+def _cache():
+    return caches[settings.HTTP_CACHE_ALIAS]
+
+
+def _tag_key(tag):
+    return f'surrogate_key:{tag}'
+
+
+def _new_version():
+    return format(time.time_ns(), 'x')
+
+
+def tag_response(response, *tags):
+    """Добавляет ответу теги, по которым его можно будет очистить."""
+    current = response.get(SURROGATE_KEY_HEADER, '').split()
+    response[SURROGATE_KEY_HEADER] = ' '.join(
+        dict.fromkeys(current + [str(tag) for tag in tags]))
+    return response
+
+
+def purge(*tags):
+    """Делает неактуальными все сохранённые ответы с любым из тегов."""
+    version = _new_version()
+    _cache().set_many({_tag_key(tag): version for tag in tags}, None)
+    _cache().add(PURGE_SEQUENCE_KEY, 0, None)
+    try:
+        _cache().incr(PURGE_SEQUENCE_KEY)
+    except ValueError:
+        # ключ вытеснили между add и incr: новое значение тоже отличается
+        _cache().set(PURGE_SEQUENCE_KEY, version, None)
+
+
+def purge_sequence():
+    """Значение счётчика очисток; меняется при каждом purge()."""
+    return _cache().get(PURGE_SEQUENCE_KEY)
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; недостающие заводятся заново."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = _cache().get_many(keys)
+    missing = {key: _new_version() for key in keys.keys() - found.keys()}
+    if missing:
+        _cache().set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+class CachingProxy:
+    """WSGI-обёртка над приложением, кэширующая ответы анонимам.
+
+    Кэшируются только ответы 200 на GET без cookie сессии, у которых есть
+    Surrogate-Key, нет Set-Cookie и нет Cache-Control: private/no-store.
+    Сам заголовок Surrogate-Key клиенту не отдаётся.
+    """
+
+    def __init__(self, app, timeout=None):
+        self.app = app
+        self.timeout = timeout
+
+    def __call__(self, environ, start_response):
+        if not self.is_cacheable_request(environ):
+            return self.app(environ, start_response)
+        key = self.cache_key(environ)
+        entry = _cache().get(key)
+        if entry is not None:
+            status, headers, body, versions = entry
+            if tag_versions(versions) == versions:
+                start_response(status, headers + [('X-Cache', 'HIT')])
+                return [body]
+        sequence = purge_sequence()
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+            return lambda data: None
+
+        chunks = self.app(environ, capture)
+        try:
+            body = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        status, headers = captured['status'], captured['headers']
+        tags = self.surrogate_keys(headers)
+        headers = [
+            (name, value) for name, value in headers
+            if name.lower() != SURROGATE_KEY_HEADER.lower()
+        ]
+        # очистка во время рендеринга: тело могло собраться из старых данных
+        if (tags is not None and self.is_cacheable_response(status, headers)
+                and purge_sequence() == sequence):
+            _cache().set(
+                key, (status, headers, body, tag_versions(tags)),
+                self.timeout or settings.HTTP_CACHE_TIMEOUT)
+        start_response(status, headers + [('X-Cache', 'MISS')])
+        return [body]
+
+    @staticmethod
+    def is_cacheable_request(environ):
+        if environ['REQUEST_METHOD'] != 'GET':
+            return False
+        cookie = environ.get('HTTP_COOKIE', '')
+        return f'{settings.SESSION_COOKIE_NAME}=' not in cookie
+
+    @staticmethod
+    def cache_key(environ):
+        url = '{}{}?{}'.format(
+            environ.get('HTTP_HOST', ''),
+            environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', ''),
+            environ.get('QUERY_STRING', ''))
+        digest = hashlib.sha1(url.encode('utf-8', 'surrogateescape'))
+        return f'http_cache:{digest.hexdigest()}'
+
+    @staticmethod
+    def surrogate_keys(headers):
+        for name, value in headers:
+            if name.lower() == SURROGATE_KEY_HEADER.lower():
+                return value.split()
+        return None
+
+    @staticmethod
+    def is_cacheable_response(status, headers):
+        if not status.startswith('200'):
+            return False
+        for name, value in headers:
+            name = name.lower()
+            if name == 'set-cookie':
+                return False
+            if name == 'cache-control' and any(
+                    directive in value.lower()
+                    for directive in UNCACHEABLE_DIRECTIVES):
+                return False
+        return True
+
+
+def forward_to(upstream):
+    """WSGI-приложение, пересылающее запросы на сервер upstream по HTTP."""
+    parts = urlsplit(upstream)
+
+    def app(environ, start_response):
+        path = environ.get('PATH_INFO', '') or '/'
+        if environ.get('QUERY_STRING'):
+            path = f'{path}?{environ["QUERY_STRING"]}'
+        headers = {
+            name[5:].replace('_', '-').title(): value
+            for name, value in environ.items() if name.startswith('HTTP_')
+        }
+        for name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            if environ.get(name):
+                headers[name.replace('_', '-').title()] = environ[name]
+        headers['X-Forwarded-For'] = environ.get('REMOTE_ADDR', '')
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else None
+        connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        try:
+            connection.request(
+                environ['REQUEST_METHOD'], path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        finally:
+            connection.close()
+        start_response(f'{response.status} {response.reason}', [
+            (name, value) for name, value in response.getheaders()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+        ])
+        return [content]
+
+    return app
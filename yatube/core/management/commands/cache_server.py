@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.cache_server import MemcachedStandIn
+
+
+class Command(BaseCommand):
+    help = ('Запускает локальный сервер кэша с протоколом memcached, '
+            'общий для всех воркеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=11211)
+
+    def handle(self, *args, **options):
+        server = MemcachedStandIn(options['host'], options['port'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Кэш слушает {server.location}. '
+            f'Воркерам задайте YATUBE_CACHE_BACKEND=memcached и '
+            f'YATUBE_CACHE_LOCATION={server.location}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
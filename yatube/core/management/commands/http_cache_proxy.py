@@ -0,0 +1,39 @@
+import socketserver
+from wsgiref.simple_server import WSGIServer, make_server
+
+from django.core.management.base import BaseCommand
+
+from core.http_cache import CachingProxy, forward_to
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    help = ('Запускает локальный обратный прокси, который кэширует ответы '
+            'анонимным посетителям и очищает их по тегам Surrogate-Key')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8080)
+        parser.add_argument(
+            '--upstream', default='http://127.0.0.1:8000',
+            help='адрес сервера приложения',
+        )
+
+    def handle(self, *args, **options):
+        proxy = CachingProxy(forward_to(options['upstream']))
+        server = make_server(
+            options['host'], options['port'], proxy,
+            server_class=ThreadingWSGIServer)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прокси слушает http://{options["host"]}:{options["port"]} '
+            f'и пересылает запросы на {options["upstream"]}. Приложению '
+            f'и прокси нужен общий кэш, см. cache_server'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,229 @@
+"""Метрики производительности запросов по именам view.
+
+PerformanceMiddleware (core.middleware) заводит на время запроса
+RequestMetrics и кладёт его в contextvar; время SQL, шаблонов и обращения
+к кэшу дописывают в него обёртка execute_wrapper, бэкенд шаблонов
+core.templates и бэкенды кэша core.cache_backends. По окончании запроса
+замер попадает в общий для процесса REGISTRY, который отдаёт их в
+текстовом формате Prometheus (view core.views.metrics).
+
+REGISTRY живёт в памяти процесса. При нескольких воркерах (gunicorn,
+uWSGI) каждый отдал бы на /metrics/ только свою долю запросов, поэтому
+для них задаётся METRICS_MULTIPROCESS_DIR: каждый процесс не чаще раза
+в METRICS_DUMP_INTERVAL секунд сбрасывает свои счётчики в отдельный файл
+этого каталога, а /metrics/ складывает файлы всех процессов. Каталог
+очищают при перезапуске приложения, как в multiprocess-режиме
+prometheus_client.
+"""
+import contextvars
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+slow_query_logger = logging.getLogger('yatube.slow_queries')
+
+# Границы корзин гистограммы времени ответа, в секундах
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL без конкретных значений: одинаковые запросы дают одну строку."""
+    sql = sql.replace('%s', '?')
+    sql = STRING_LITERAL_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.view = None
+        self.db_time = 0.0
+        self.queries = 0
+        self.slow_queries = 0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries += 1
+            if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+                self.slow_queries += 1
+                slow_query_logger.warning(
+                    '%.1f ms %s: %s', duration * 1000,
+                    self.view or '<unresolved>', normalize_sql(sql))
+
+
+def current():
+    """Замеры текущего запроса или None вне PerformanceMiddleware."""
+    return _current.get()
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+class Registry:
+    """Накопленные по view счётчики, общие для всех потоков процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(self._empty)
+        self._dumped = 0.0
+        self._file_name = f'{os.getpid()}-{uuid.uuid4().hex}.json'
+
+    @staticmethod
+    def _empty():
+        return {
+            'requests': 0,
+            'duration': 0.0,
+            'buckets': [0] * len(DURATION_BUCKETS),
+            'db_time': 0.0,
+            'queries': 0,
+            'slow_queries': 0,
+            'template_time': 0.0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+        }
+
+    def observe(self, metrics, duration):
+        with self._lock:
+            view = self._views[metrics.view or '<unresolved>']
+            view['requests'] += 1
+            view['duration'] += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    view['buckets'][index] += 1
+            view['db_time'] += metrics.db_time
+            view['queries'] += metrics.queries
+            view['slow_queries'] += metrics.slow_queries
+            view['template_time'] += metrics.template_time
+            view['cache_hits'] += metrics.cache_hits
+            view['cache_misses'] += metrics.cache_misses
+        if (settings.METRICS_MULTIPROCESS_DIR and time.monotonic()
+                - self._dumped >= settings.METRICS_DUMP_INTERVAL):
+            self.dump()
+
+    def dump(self):
+        """Записывает счётчики процесса в его файл общего каталога."""
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        self._dumped = time.monotonic()
+        path = os.path.join(directory, self._file_name)
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Счётчики всех процессов: из файлов каталога или свои."""
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        if not directory:
+            return self.snapshot()
+        self.dump()
+        merged = defaultdict(self._empty)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                with open(path) as file:
+                    views = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, values in views.items():
+                total = merged[name]
+                for key, value in values.items():
+                    if key == 'buckets':
+                        total[key] = [
+                            a + b for a, b in zip(total[key], value)]
+                    else:
+                        total[key] += value
+        return dict(merged)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(values, buckets=list(values['buckets']))
+                for name, values in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def exposition(self):
+        """Текст в формате Prometheus exposition 0.0.4."""
+        views = sorted(self.collect().items())
+        lines = [
+            '# HELP yatube_request_duration_seconds Время ответа view.',
+            '# TYPE yatube_request_duration_seconds histogram',
+        ]
+        for name, values in views:
+            label = _label(name)
+            for bound, count in zip(DURATION_BUCKETS, values['buckets']):
+                lines.append(
+                    f'yatube_request_duration_seconds_bucket'
+                    f'{{view="{label}",le="{bound}"}} {count}')
+            lines += [
+                f'yatube_request_duration_seconds_bucket'
+                f'{{view="{label}",le="+Inf"}} {values["requests"]}',
+                f'yatube_request_duration_seconds_sum{{view="{label}"}} '
+                f'{values["duration"]:.6f}',
+                f'yatube_request_duration_seconds_count{{view="{label}"}} '
+                f'{values["requests"]}',
+            ]
+        for metric, key, kind, text in COUNTERS:
+            lines += [f'# HELP {metric} {text}', f'# TYPE {metric} {kind}']
+            for name, values in views:
+                value = values[key]
+                if isinstance(value, float):
+                    value = f'{value:.6f}'
+                lines.append(f'{metric}{{view="{_label(name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+COUNTERS = (
+    ('yatube_db_duration_seconds_total', 'db_time', 'counter',
+     'Суммарное время SQL-запросов.'),
+    ('yatube_db_queries_total', 'queries', 'counter', 'Число SQL-запросов.'),
+    ('yatube_db_slow_queries_total', 'slow_queries', 'counter',
+     'Число запросов дольше SLOW_QUERY_THRESHOLD_MS.'),
+    ('yatube_template_duration_seconds_total', 'template_time', 'counter',
+     'Суммарное время рендеринга шаблонов.'),
+    ('yatube_cache_hits_total', 'cache_hits', 'counter',
+     'Попадания в кэш.'),
+    ('yatube_cache_misses_total', 'cache_misses', 'counter',
+     'Промахи мимо кэша.'),
+)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+REGISTRY = Registry()
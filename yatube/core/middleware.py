@@ -0,0 +1,60 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    """Замеряет запрос и отдаёт замеры в Server-Timing и core.metrics.
+
+    Ставится первым в MIDDLEWARE, чтобы время включало остальные
+    middleware. Время SQL снимается через execute_wrapper и не требует
+    DEBUG, поэтому middleware годится и для продакшена.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.activate(request_metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_metrics.execute))
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        duration = time.perf_counter() - started
+        if request_metrics.view is None:
+            request_metrics.view = self.view_name(request)
+        metrics.REGISTRY.observe(request_metrics, duration)
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(
+                request_metrics, duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # имя view нужно уже во время запроса — для журнала медленного SQL
+        metrics.current().view = self.view_name(request)
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    @staticmethod
+    def server_timing(request_metrics, duration):
+        return ', '.join((
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={request_metrics.db_time * 1000:.1f};'
+            f'desc="{request_metrics.queries} queries"',
+            f'tpl;dur={request_metrics.template_time * 1000:.1f}',
+            f'cache;desc="{request_metrics.cache_hits} hits, '
+            f'{request_metrics.cache_misses} misses"',
+        ))
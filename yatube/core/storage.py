@@ -0,0 +1,70 @@
+"""Файловое хранилище, адресующее файлы по хешу содержимого.
+
+Имя файла строится из SHA-256 его байтов, поэтому одинаковые загрузки
+ложатся в один и тот же файл и на диск пишутся один раз. Учёт ссылок и
+удаление ненужных файлов — забота вызывающего кода (см. posts.media):
+перед тем как переиспользовать файл, хранилище вызывает его функцию
+reserve, чтобы параллельное удаление этот файл не тронуло.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+HASH_CHUNK_SIZE = 64 * 1024
+CONTENT_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+def content_hash(content):
+    """SHA-256 файла, прочитанного потоком; позиция в файле сбрасывается."""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который кладёт файл в <каталог>/<ab>/<sha256>.<ext>.
+
+    Каталог берётся из upload_to, расширение — из исходного имени. Если
+    такой файл уже есть, повторно он не записывается. reserve — путь к
+    функции, которая получает имя файла до проверки, есть ли он.
+    """
+
+    def __init__(self, *args, reserve=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reserve = reserve
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_hash(content)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = '/'.join(
+            part for part in (directory, digest[:2], digest + extension)
+            if part)
+        if self.reserve:
+            import_string(self.reserve)(name)
+        if self.exists(name):
+            return name
+        saved = self._save(name, content)
+        if saved != name:
+            # тот же файл параллельно записал другой процесс
+            self.delete(saved)
+        return name
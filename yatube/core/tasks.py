@@ -0,0 +1,53 @@
+"""Фоновый пул потоков для работы, которую запрос не должен ждать.
+
+Задачи выполняются в этом же процессе после фиксации транзакции, в которой
+их поставили. Ошибка задачи пишется в лог и не влияет на ответ.
+С BACKGROUND_TASKS_ASYNC = False задачи выполняются сразу и синхронно —
+так их удобно проверять в тестах.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='yatube-background',
+            )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         func.__qualname__)
+    finally:
+        # у каждого потока пула свои соединения с БД
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Сразу отправляет задачу в пул и возвращает Future."""
+    return get_executor().submit(_run, func, args, kwargs)
+
+
+def defer(func, *args, **kwargs):
+    """Ставит задачу в пул после фиксации текущей транзакции."""
+    if not settings.BACKGROUND_TASKS_ASYNC:
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
@@ -0,0 +1,35 @@
+"""Бэкенд шаблонов Django, замеряющий время рендеринга.
+
+Считается только рендеринг шаблона верхнего уровня (include рендерится
+внутри него), поэтому время не задваивается. Результат попадает в замеры
+текущего запроса (core.metrics).
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .metrics import current
+
+
+class InstrumentedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
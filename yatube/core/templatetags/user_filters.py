@@ -12,3 +12,13 @@ def addclass(field, css):
 # синтаксис @register... , под который описана функция addclass() -
 # это применение "декораторов", функций, меняющих поведение функций
 # Не бойтесь соб@к
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor=None):
+    """Ссылка на страницу по курсору с остальными параметрами запроса."""
+    query = context['request'].GET.copy()
+    query.pop('cursor', None)
+    if cursor:
+        query['cursor'] = cursor
+    return f'?{query.urlencode()}'
@@ -1,4 +1,22 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from wsgiref.util import setup_testing_defaults
+
+from django.core.cache import cache
+from django.core.cache.backends.memcached import MemcachedCache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished
+from django.db import OperationalError, close_old_connections, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post, User
+
+from core.cache_server import MemcachedStandIn
+from core.db.sqlite3.base import DatabaseWrapper
+from core.http_cache import CachingProxy, purge
+from core.metrics import REGISTRY, Registry, RequestMetrics, normalize_sql
 
 
 class ViewTestClass(TestCase):
@@ -14,3 +32,330 @@ class ViewTestClass(TestCase):
         'core/404.html'."""
         response = self.client.get('/nonexist-page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheStandInTests(TestCase):
+    """Два клиента memcached — как два воркера — видят общий кэш."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = MemcachedStandIn().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def make_worker_cache(self):
+        worker_cache = MemcachedCache(self.server.location, {})
+        self.addCleanup(worker_cache.close)
+        return worker_cache
+
+    def setUp(self):
+        self.first = self.make_worker_cache()
+        self.second = self.make_worker_cache()
+        self.first.clear()
+
+    def test_value_is_shared_between_workers(self):
+        self.first.set('post_card', {'id': 1, 'text': 'Пост'})
+        self.assertEqual(
+            self.second.get('post_card'), {'id': 1, 'text': 'Пост'})
+
+    def test_invalidation_reaches_other_workers(self):
+        self.first.set_many({'a': 1, 'b': 2})
+        self.second.delete('a')
+        self.assertEqual(self.first.get_many(['a', 'b']), {'b': 2})
+
+    def test_add_incr_and_expire(self):
+        self.assertTrue(self.first.add('counter', 1))
+        self.assertFalse(self.second.add('counter', 5))
+        self.assertEqual(self.second.incr('counter', 2), 3)
+        self.first.set('short', 'value', -1)
+        self.assertIsNone(self.second.get('short'))
+
+
+class CachingProxyTests(TestCase):
+    """Прокси отдаёт анонимам сохранённые страницы и очищает их по тегам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.proxy = CachingProxy(WSGIHandler())
+        # как и тестовый клиент, не даём обработчику закрыть соединение
+        # с БД посреди транзакции теста
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+    def fetch(self, path, **environ):
+        environ.update(
+            REQUEST_METHOD='GET', PATH_INFO=path, HTTP_HOST='testserver')
+        setup_testing_defaults(environ)
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, dict(headers)
+
+        body = b''.join(self.proxy(environ, start_response))
+        return captured['status'], captured['headers'], body
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный анонимный запрос не доходит до Django и БД"""
+        url = reverse('posts:index')
+        status, headers, body = self.fetch(url)
+        self.assertTrue(status.startswith('200'))
+        self.assertEqual(headers['X-Cache'], 'MISS')
+        self.assertNotIn('Surrogate-Key', headers)
+        with self.assertNumQueries(0):
+            status, headers, cached = self.fetch(url)
+        self.assertEqual(headers['X-Cache'], 'HIT')
+        self.assertEqual(cached, body)
+
+    def test_session_bypasses_cache(self):
+        url = reverse('posts:index')
+        self.fetch(url)
+        _, headers, _ = self.fetch(url, HTTP_COOKIE='sessionid=abc')
+        self.assertNotIn('X-Cache', headers)
+
+    def test_views_tag_responses(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(
+            response['Surrogate-Key'].split(),
+            [f'post-{self.post.pk}', f'author-{self.author.pk}'])
+
+    def test_writes_purge_tagged_pages(self):
+        """Новый комментарий и новый пост очищают страницы с их тегами"""
+        detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+        index = reverse('posts:index')
+        self.fetch(detail)
+        self.fetch(index)
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Свежий комментарий'})
+        _, headers, body = self.fetch(detail)
+        self.assertEqual(headers['X-Cache'], 'MISS')
+        self.assertIn('Свежий комментарий', body.decode())
+        self.fetch(index)
+        self.client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        _, headers, body = self.fetch(index)
+        self.assertEqual(headers['X-Cache'], 'MISS')
+        self.assertIn('Новый пост', body.decode())
+
+    def test_post_delete_purges_tagged_pages(self):
+        """Удалённый пост без комментариев пропадает со страниц в кэше"""
+        post = Post.objects.create(text='Пост на удаление', author=self.author)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            self.fetch(url)
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                _, headers, body = self.fetch(url)
+                self.assertEqual(headers['X-Cache'], 'MISS')
+                self.assertNotIn('Пост на удаление', body.decode())
+
+    def test_purge_during_render_skips_store(self):
+        """Ответ, во время рендеринга которого прошла очистка, не
+        сохраняется: иначе старое тело жило бы под новыми версиями"""
+        url = reverse('posts:index')
+        handler = self.proxy.app
+
+        def purging_app(environ, start_response):
+            chunks = handler(environ, start_response)
+            purge(f'post-{self.post.pk}')
+            return chunks
+
+        self.proxy.app = purging_app
+        self.fetch(url)
+        self.proxy.app = handler
+        _, headers, _ = self.fetch(url)
+        self.assertEqual(headers['X-Cache'], 'MISS')
+
+    def test_renames_purge_tagged_pages(self):
+        """Переименование автора и группы очищает страницы с ними"""
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        index = reverse('posts:index')
+        self.fetch(index)
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        _, headers, body = self.fetch(index)
+        self.assertEqual(headers['X-Cache'], 'MISS')
+        self.assertIn('Новое имя', body.decode())
+        group_url = reverse('posts:group_list', kwargs={'slug': 'group'})
+        self.fetch(group_url)
+        group.title = 'Новая группа'
+        group.save()
+        _, headers, body = self.fetch(group_url)
+        self.assertEqual(headers['X-Cache'], 'MISS')
+        self.assertIn('Новая группа', body.decode())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """Замеры запроса попадают в Server-Timing, /metrics/ и журнал SQL."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Текст поста', author=author)
+
+    def setUp(self):
+        cache.clear()
+        REGISTRY.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'tpl;dur=', 'cache;desc='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
+    def test_metrics_grouped_by_view(self):
+        """Запросы, SQL и обращения к кэшу копятся по имени view"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        index = REGISTRY.snapshot()['posts:index']
+        self.assertEqual(index['requests'], 2)
+        self.assertGreater(index['queries'], 0)
+        self.assertGreater(index['template_time'], 0)
+        self.assertGreater(index['cache_misses'], 0)
+        self.assertGreater(index['cache_hits'], 0)
+
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, 'yatube_request_duration_seconds_count'
+            '{view="posts:index"} 1')
+        self.assertContains(response, 'yatube_db_queries_total')
+
+    def test_prometheus_endpoint_sums_processes(self):
+        """В общем каталоге /metrics/ складывает счётчики всех процессов"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        metrics = RequestMetrics()
+        metrics.view = 'posts:index'
+        with self.settings(METRICS_MULTIPROCESS_DIR=directory):
+            # соседний процесс со своим реестром
+            Registry().observe(metrics, 0.01)
+            self.client.get(reverse('posts:index'))
+            response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response, 'yatube_request_duration_seconds_count'
+            '{view="posts:index"} 2')
+
+    def test_prometheus_endpoint_closed_for_others(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_logged_with_view(self):
+        with self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index: SELECT', logs.output[-1])
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT *  FROM t WHERE id IN (%s, %s, %s) "
+                "AND name = 'Лев' LIMIT 10"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?')
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    """Бэкенд core.db.sqlite3 на файле: PRAGMA и очередь на запись."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.settings_dict = dict(
+            connections['default'].settings_dict,
+            NAME=os.path.join(directory, 'tuned.sqlite3'),
+            OPTIONS={'timeout': 0.2},
+            SERIALIZE_WRITES=True)
+        self.settings_dict['PRAGMAS'] = {
+            'journal_mode': 'wal', 'synchronous': 'normal'}
+        primary = self.wrapper()
+        with primary.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (id INTEGER PRIMARY KEY)')
+        primary.close()
+
+    def wrapper(self):
+        wrapper = DatabaseWrapper(self.settings_dict, alias='tuned')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def in_thread(self, function):
+        """Выполняет function со своим соединением в другом потоке."""
+        outcome = {}
+
+        def target():
+            wrapper = DatabaseWrapper(self.settings_dict, alias='tuned')
+            try:
+                outcome['result'] = function(wrapper)
+            except OperationalError as error:
+                outcome['error'] = error
+            finally:
+                wrapper.close()
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+        return outcome
+
+    @staticmethod
+    def insert(wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO note DEFAULT VALUES')
+
+    @staticmethod
+    def count(wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM note')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        with self.wrapper().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_writes_wait_in_queue_and_reads_do_not(self):
+        """Пока открыта пишущая транзакция, запись ждёт, а чтение — нет"""
+        writer = self.wrapper()
+        writer.set_autocommit(
+            False, force_begin_transaction_with_broken_autocommit=True)
+        self.insert(writer)
+        self.assertEqual(self.in_thread(self.count), {'result': 0})
+        self.assertIn('очередь', str(self.in_thread(self.insert)['error']))
+        writer.commit()
+        writer.set_autocommit(True)
+        self.assertEqual(self.in_thread(self.insert), {'result': None})
+        self.assertEqual(self.count(writer), 2)
+
+    def test_read_only_atomic_does_not_take_write_lock(self):
+        """Транзакция, которая только читает, не держит очередь на запись"""
+        reader = self.wrapper()
+        reader.set_autocommit(
+            False, force_begin_transaction_with_broken_autocommit=True)
+        self.count(reader)
+        self.assertFalse(reader._holds_write_lock)
+        self.assertEqual(self.in_thread(self.insert), {'result': None})
+        reader.rollback()
+        reader.set_autocommit(True)
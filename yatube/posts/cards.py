@@ -0,0 +1,62 @@
+import time
+
+from django.core.cache import cache
+
+
+def _post_key(post_id):
+    return f'post_card_version:{post_id}'
+
+
+def _author_key(author_id):
+    return f'author_card_version:{author_id}'
+
+
+def _group_key(group_id):
+    return f'group_card_version:{group_id}'
+
+
+def _new_version():
+    return format(time.time_ns(), 'x')
+
+
+def attach_card_versions(posts):
+    """Проставляет постам card_version одним обращением к кэшу.
+
+    Версия карточки складывается из версий поста, его автора и группы и
+    входит в ключ фрагмента в posts/includes/article.html, поэтому сам
+    фрагмент хранится долго: устаревшую карточку вытесняет смена ключа,
+    а не истечение срока. Если версия потерялась из кэша, заводится
+    новая, поэтому старый фрагмент никогда не будет принят за актуальный.
+    """
+    posts = list(posts)
+    keys = set()
+    for post in posts:
+        keys.update(_card_keys(post))
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys - versions.keys()}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    for post in posts:
+        post.card_version = '.'.join(
+            versions[key] for key in _card_keys(post))
+    return posts
+
+
+def _card_keys(post):
+    keys = [_post_key(post.pk), _author_key(post.author_id)]
+    if post.group_id is not None:
+        keys.append(_group_key(post.group_id))
+    return keys
+
+
+def invalidate_post_card(post_id):
+    cache.set(_post_key(post_id), _new_version(), None)
+
+
+def invalidate_author_cards(author_id):
+    cache.set(_author_key(author_id), _new_version(), None)
+
+
+def invalidate_group_cards(group_id):
+    cache.set(_group_key(group_id), _new_version(), None)
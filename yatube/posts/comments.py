@@ -0,0 +1,136 @@
+"""Ветки комментариев на материализованном пути и их постраничный вывод.
+
+Путь комментария — id всех его предков и его самого, дополненные нулями
+до одной ширины и разделённые точкой: 0000000012.0000000040. Поэтому
+сортировка по пути даёт обход дерева в глубину в порядке ответов, а вся
+ветка под комментарием — диапазон путей, который читается одним
+запросом по индексу (post, path) без рекурсии.
+
+Комментарии к самому посту выводятся страницами по курсору, сначала
+новые или сначала старые; ответы подгружаются отдельным фрагментом.
+
+У комментариев, созданных до появления пути, он пуст; их пути строит
+команда recount (backfill_paths). До этого ответить на такой комментарий
+или открыть его ветку нельзя: пустой путь дал бы диапазон, в который
+попадают ответы на все такие комментарии поста.
+"""
+from django.db.models import Q
+
+from .models import COMMENT_PATH_SEPARATOR, COMMENT_FIELDS, Comment
+from .utils import CursorPaginator
+
+SEGMENT_WIDTH = 10
+# Глубже ответы прикрепляются к предку на последнем допустимом уровне,
+# чтобы путь влез в поле
+MAX_DEPTH = 20
+COMMENTS_PER_PAGE = 20
+COMMENT_ORDERINGS = {
+    'old': ('created', 'id'),
+    'new': ('-created', '-id'),
+}
+DEFAULT_ORDER = 'old'
+THREAD_ORDERING = ('path',)
+# Символ сразу за разделителем: верхняя граница диапазона ветки
+PATH_UPPER_BOUND = chr(ord(COMMENT_PATH_SEPARATOR) + 1)
+BACKFILL_BATCH_SIZE = 1000
+
+
+class MissingPathError(ValueError):
+    """У комментария ещё нет пути: нужно запустить команду recount."""
+
+
+def _require_path(comment):
+    if not comment.path:
+        raise MissingPathError(
+            f'У комментария {comment.pk} нет пути, запустите recount')
+
+
+def _path(parent_path, pk):
+    segment = str(pk).zfill(SEGMENT_WIDTH)
+    if parent_path is None:
+        return segment
+    return COMMENT_PATH_SEPARATOR.join((parent_path, segment))
+
+
+def reply_parent(parent):
+    """Комментарий, к которому на самом деле прикрепится ответ.
+
+    Слишком глубокий ответ уходит к предку на уровне MAX_DEPTH - 2; его id
+    берётся прямо из пути, поэтому предок читается одним запросом.
+    """
+    if parent is None:
+        return parent
+    _require_path(parent)
+    if parent.depth < MAX_DEPTH - 1:
+        return parent
+    ancestor_id = parent.path.split(COMMENT_PATH_SEPARATOR)[MAX_DEPTH - 2]
+    return Comment.objects.get(pk=int(ancestor_id))
+
+
+def assign_path(comment):
+    """Записывает путь только что сохранённого комментария."""
+    parent_path = None
+    if comment.parent_id is not None:
+        _require_path(comment.parent)
+        parent_path = comment.parent.path
+    comment.path = _path(parent_path, comment.pk)
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path)
+
+
+def backfill_paths():
+    """Строит пути комментариям, у которых их нет; возвращает их число.
+
+    Каждый проход заполняет комментарии, чей родитель уже с путём, так что
+    дерево заполняется сверху вниз.
+    """
+    total = 0
+    while True:
+        rows = Comment.objects.filter(path='').filter(
+            Q(parent=None) | ~Q(parent__path='')
+        ).order_by('pk').values_list('pk', 'parent__path')
+        batch = [
+            Comment(pk=pk, path=_path(parent_path, pk))
+            for pk, parent_path in rows[:BACKFILL_BATCH_SIZE]
+        ]
+        if not batch:
+            return total
+        Comment.objects.bulk_update(batch, ['path'])
+        total += len(batch)
+
+
+def thread(comment):
+    """Все ответы в ветке комментария, одним диапазоном путей."""
+    _require_path(comment)
+    return Comment.objects.filter(
+        post_id=comment.post_id,
+        path__gt=comment.path + COMMENT_PATH_SEPARATOR,
+        path__lt=comment.path + PATH_UPPER_BOUND,
+    ).select_related('author').only(*COMMENT_FIELDS)
+
+
+def roots(post_id):
+    """Комментарии к самому посту, без ответов."""
+    return Comment.objects.filter(
+        post_id=post_id, parent=None
+    ).select_related('author').only(*COMMENT_FIELDS)
+
+
+def order_from(request):
+    order = request.GET.get('order')
+    return order if order in COMMENT_ORDERINGS else DEFAULT_ORDER
+
+
+def roots_page(request, post_id):
+    """Страница комментариев к посту по курсору из запроса."""
+    ordering = COMMENT_ORDERINGS[order_from(request)]
+    paginator = CursorPaginator(
+        roots(post_id).order_by(*ordering), COMMENTS_PER_PAGE, ordering)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def thread_page(request, comment):
+    """Страница ответов в ветке комментария, в порядке обхода дерева."""
+    paginator = CursorPaginator(
+        thread(comment).order_by(*THREAD_ORDERING), COMMENTS_PER_PAGE,
+        THREAD_ORDERING)
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,72 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserCounters
+
+
+def bump_user(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на заданные величины.
+
+    Если строки счётчиков ещё нет (пользователь создан до их появления),
+    ничего не делает: такие строки создаёт команда recount.
+    """
+    for field, delta in deltas.items():
+        _bump(UserCounters.objects.filter(user_id=user_id), field, delta)
+
+
+def bump_comments(post_id, delta):
+    _bump(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def bump_replies(comment_id, delta):
+    _bump(Comment.objects.filter(pk=comment_id), 'replies_count', delta)
+
+
+def _bump(queryset, field, delta):
+    # счётчики беззнаковые: разошедшийся с данными ноль не уводим в минус
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount(users=None, posts=None, comments=None):
+    """Пересчитывает счётчики по фактическим данным.
+
+    users, posts и comments — выборки id, которыми ограничен пересчёт
+    счётчиков пользователей, постов и комментариев; None — все строки.
+    Возвращает число пользователей, чьи счётчики были пересчитаны.
+    """
+    existing = UserCounters.objects.values_list('user_id', flat=True)
+    missing = User.objects.exclude(pk__in=existing)
+    if users is not None:
+        missing = missing.filter(pk__in=users)
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=user_id) for user_id in
+         missing.values_list('pk', flat=True)),
+        batch_size=1000,
+    )
+    user_counters = UserCounters.objects.all()
+    if users is not None:
+        user_counters = user_counters.filter(user_id__in=users)
+    total = user_counters.update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+    post_rows = Post.objects.all()
+    if posts is not None:
+        post_rows = post_rows.filter(pk__in=posts)
+    post_rows.update(comments_count=_count(Comment, 'post'))
+    comment_rows = Comment.objects.all()
+    if comments is not None:
+        comment_rows = comment_rows.filter(pk__in=comments)
+    comment_rows.update(replies_count=_count(Comment, 'parent'))
+    return total
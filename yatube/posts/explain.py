@@ -0,0 +1,100 @@
+"""Планы запросов лент: EXPLAIN и поиск полных просмотров таблиц.
+
+Запросы строятся тем же кодом, что и во view, на реальных id из базы,
+поэтому план совпадает с тем, что выполняет сайт. Полным просмотром
+считается SCAN таблицы без индекса в SQLite и Seq Scan в PostgreSQL;
+отдельно отмечается сортировка, которую не покрыл индекс.
+"""
+import re
+
+from django.db import connection
+
+from . import comments
+from .models import (Comment, FeedItem, Follow, Group, Post, TrendingScore,
+                     User)
+from .trending import TRENDING_ORDERING
+from .utils import (FEED_ORDERING, POSTS_PER_PAGE_10, TIMELINE_ORDERING,
+                    CursorPaginator)
+
+FULL_SCAN_RE = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bINDEX\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+SORT_RE = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+def _page(queryset, ordering):
+    """Первая и следующая по курсору страницы ленты."""
+    paginator = CursorPaginator(queryset, POSTS_PER_PAGE_10, ordering)
+    first = queryset.order_by(*ordering)[:POSTS_PER_PAGE_10 + 1]
+    last = first[POSTS_PER_PAGE_10 - 1:POSTS_PER_PAGE_10].first()
+    if last is None:
+        return [first]
+    values, _ = paginator.decode_cursor(paginator.encode_cursor(last))
+    following = queryset.order_by(*ordering).filter(
+        paginator._after(values, False))[:POSTS_PER_PAGE_10 + 1]
+    return [first, following]
+
+
+def feed_queries():
+    """Пары (название, queryset) для запросов, которые выполняют ленты."""
+    post = Post.objects.first() or Post(pk=1, author_id=1)
+    user = User.objects.first() or User(pk=1)
+    group = Group.objects.first() or Group(pk=1)
+    queries = []
+    for name, queryset, ordering in (
+            ('index', Post.objects.for_feed(), FEED_ORDERING),
+            ('group_posts', group.related_posts_in_group.for_feed(),
+             FEED_ORDERING),
+            ('profile', Post.objects.filter(author_id=post.author_id)
+             .for_feed(), FEED_ORDERING),
+            ('follow_index', FeedItem.objects.for_feed(user),
+             TIMELINE_ORDERING),
+            ('trending', TrendingScore.objects.for_feed(),
+             TRENDING_ORDERING)):
+        pages = _page(queryset, ordering)
+        queries.append((name, pages[0]))
+        if len(pages) > 1:
+            queries.append((f'{name} (по курсору)', pages[1]))
+    comment = Comment.objects.first() or Comment(
+        pk=1, post_id=post.pk, path='0000000001')
+    for name, queryset, ordering in (
+            ('comments', comments.roots(post.pk),
+             comments.COMMENT_ORDERINGS['new']),
+            ('comment_thread', comments.thread(comment),
+             comments.THREAD_ORDERING)):
+        queries.append((name, queryset.order_by(*ordering)[
+            :comments.COMMENTS_PER_PAGE + 1]))
+    queries += [
+        ('comments_api', Comment.objects.for_post(post)),
+        ('follow_exists', Follow.objects.filter(
+            user_id=user.pk, author_id=post.author_id)),
+        ('followers', Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id')),
+    ]
+    return queries
+
+
+def problems(plan, vendor=None):
+    """Полные просмотры таблиц и лишние сортировки в тексте плана."""
+    vendor = vendor or connection.vendor
+    found = []
+    for line in plan.splitlines():
+        scan = FULL_SCAN_RE.get(vendor) and FULL_SCAN_RE[vendor].search(line)
+        if scan:
+            found.append(f'полный просмотр {scan.group(1)}')
+        if SORT_RE.get(vendor) and SORT_RE[vendor].search(line):
+            found.append('сортировка без индекса')
+    return found
+
+
+def explain_feeds():
+    """Список (название, план, проблемы) по всем запросам лент."""
+    report = []
+    for name, queryset in feed_queries():
+        plan = queryset.explain()
+        report.append((name, plan, problems(plan)))
+    return report
@@ -0,0 +1,59 @@
+from .graph import follow_graph
+from .models import FeedItem, Follow, Post
+
+FEED_BATCH_SIZE = 1000
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    follower_ids = follow_graph().followers_of(post.author_id)
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, post_id=post.pk,
+                     pub_date=post.pub_date)
+            for user_id in follower_ids
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune_feed(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild_feeds(user_ids=None):
+    """Пересобирает ленты с нуля по таблице Follow.
+
+    Возвращает число обработанных подписок.
+    """
+    items = FeedItem.objects.all()
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    items.delete()
+    total = 0
+    for user_id, author_id in follows.values_list(
+            'user_id', 'author_id').iterator():
+        backfill_feed(user_id, author_id)
+        total += 1
+    return total
@@ -4,6 +4,25 @@ from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # загрузки, отклонённые posts.uploads, в поля формы не попадают
+        self.rejected_uploads = {}
+        for name, upload in self.files.items():
+            rejection = getattr(upload, 'rejection', None)
+            if rejection:
+                self.rejected_uploads[name] = rejection
+        if self.rejected_uploads:
+            self.files = self.files.copy()
+            for name in self.rejected_uploads:
+                del self.files[name]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, rejection in self.rejected_uploads.items():
+            self.add_error(name, rejection)
+        return cleaned_data
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
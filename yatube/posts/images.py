@@ -0,0 +1,72 @@
+"""Обработка загруженной картинки поста вне запроса.
+
+View только сохраняет принятый файл и ставит обработку в фоновый пул
+(core.tasks). Там картинка поворачивается по EXIF, пересохраняется в
+сжатом каноническом формате без метаданных, после чего строятся
+миниатюры (posts.thumbnails).
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from core.tasks import defer
+
+from . import media
+from .models import Post
+from .thumbnails import generate_thumbnails
+
+JPEG_QUALITY = 85
+
+
+def normalize_image(post_id):
+    """Пересохраняет картинку поста без EXIF в JPEG (или PNG с прозрачностью).
+
+    Анимированные картинки оставляет как есть.
+    """
+    post = Post.objects.only('image').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    old_name = post.image.name
+    storage = post.image.storage
+    with storage.open(old_name) as source:
+        image = Image.open(source)
+        if getattr(image, 'is_animated', False):
+            return
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    buffer = BytesIO()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image_format, extension = 'PNG', 'png'
+        image.save(buffer, image_format, optimize=True)
+    else:
+        image_format, extension = 'JPEG', 'jpg'
+        image.convert('RGB').save(
+            buffer, image_format, quality=JPEG_QUALITY, optimize=True,
+            progressive=True)
+    new_name = storage.save(
+        post.image.field.generate_filename(post, f'image.{extension}'),
+        ContentFile(buffer.getvalue()))
+    if new_name == old_name:
+        return
+    updated = Post.objects.filter(pk=post_id, image=old_name).update(
+        image=new_name)
+    if updated:
+        media.replace(old_name, new_name)
+    else:
+        # картинку успели заменить, пока мы её обрабатывали
+        media.unreserve(new_name)
+        media.delete_files(new_name)
+
+
+def process_image(post_id):
+    normalize_image(post_id)
+    generate_thumbnails(post_id)
+
+
+def schedule_processing(post):
+    """Сбрасывает готовность миниатюр и ставит обработку в фоновый пул."""
+    Post.objects.filter(pk=post.pk).update(
+        thumbnails_ready=False, image_width=None, image_height=None)
+    if post.image:
+        defer(process_image, post.pk)
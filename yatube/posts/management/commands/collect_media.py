@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.media import ORPHAN_GRACE_SECONDS, collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает ссылки постов на картинки и удаляет файлы '
+            'и миниатюры, на которые никто не ссылается')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только посчитать, ничего не удаляя',
+        )
+        parser.add_argument(
+            '--grace', type=int, default=ORPHAN_GRACE_SECONDS,
+            help='не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        removed, freed = collect_garbage(
+            dry_run=options['dry_run'], grace=options['grace'])
+        verb = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, {filesizeformat(freed)}'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.explain import explain_feeds
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов лент и отмечает полные '
+            'просмотры таблиц и сортировки без индекса')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='печатать планы всех запросов, а не только проблемных',
+        )
+        parser.add_argument(
+            '--fail', action='store_true',
+            help='завершиться с ошибкой, если найден полный просмотр',
+        )
+
+    def handle(self, *args, **options):
+        flagged = 0
+        for name, plan, problems in explain_feeds():
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: {", ".join(problems)}'))
+            else:
+                self.stdout.write(f'{name}: по индексу')
+            if problems or options['verbose_plans']:
+                self.stdout.write(plan)
+        if flagged and options['fail']:
+            raise CommandError(f'Запросов без индекса: {flagged}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено запросов, с замечаниями: {flagged}'))
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (DEFAULT_CHUNK_SIZE, FORMATS, TRANSFER_MODELS,
+                            export_rows)
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает пользователей, группы, посты, подписки и '
+            'комментарии в NDJSON или CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-', help='файл выгрузки, «-» — stdout')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--models', default=','.join(TRANSFER_MODELS),
+            help='модели через запятую: ' + ', '.join(TRANSFER_MODELS))
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='сколько строк читать из БД за раз')
+
+    def handle(self, *args, **options):
+        models = [name for name in options['models'].split(',') if name]
+        unknown = set(models) - TRANSFER_MODELS.keys()
+        if unknown:
+            raise CommandError(f'Неизвестные модели: {", ".join(unknown)}')
+        output_format = options['format'] or (
+            'csv' if options['output'].endswith('.csv') else 'ndjson')
+        if options['output'] == '-':
+            stream = sys.stdout
+        else:
+            stream = open(
+                options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            totals = export_rows(
+                models, stream, output_format, options['chunk_size'])
+        except ValueError as error:
+            raise CommandError(error)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(self.style.SUCCESS(
+            'Выгружено: ' + ', '.join(
+                f'{name} {total}' for name, total in totals.items())))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.graph import FollowGraph, prune_changes
+
+
+class Command(BaseCommand):
+    help = ('Собирает граф подписок в памяти и печатает его размер и время '
+            'сборки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='удалить из журнала подписок записи старше суток',
+        )
+
+    def handle(self, *args, **options):
+        graph = FollowGraph()
+        graph.build()
+        report = graph.memory_report()
+        total = (report['following_bytes'] + report['followers_bytes']
+                 + report['changes_bytes'])
+        self.stdout.write(
+            f'Подписок: {report["edges"]}, подписчиков: {report["users"]}, '
+            f'авторов: {report["authors"]}')
+        self.stdout.write(
+            f'Подписки: {report["following_bytes"]} Б, подписчики: '
+            f'{report["followers_bytes"]} Б, всего: {total / 2 ** 20:.1f} МБ')
+        self.stdout.write(f'Сборка: {report["build_seconds"]} с')
+        if options['prune']:
+            deleted = prune_changes()
+            self.stdout.write(
+                self.style.SUCCESS(f'Из журнала удалено записей: {deleted}'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для постов с картинками, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='перестроить миниатюры всех постов с картинками',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails_ready=False)
+        total = failed = 0
+        for post_id in posts.values_list('id', flat=True).iterator():
+            try:
+                generate_thumbnails(post_id, force=options['all'])
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Пост {post_id}: {error}')
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры обработаны для постов: {total}, с ошибками: {failed}'))
@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (DEFAULT_BATCH_SIZE, FORMATS, TRANSFER_MODELS,
+                            import_rows, rebuild_derived)
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает выгрузку export_posts пачками bulk_create '
+            'и пересобирает ленты, счётчики и поисковый индекс')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='файл выгрузки, «-» — stdin')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--model', choices=list(TRANSFER_MODELS),
+            help='модель строк CSV')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='пропускать строки, которые уже есть в базе')
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='не пересобирать ленты, счётчики и индекс после загрузки')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or (
+            'csv' if options['input'].endswith('.csv') else 'ndjson')
+        if options['input'] == '-':
+            stream = sys.stdin
+        else:
+            stream = open(options['input'], encoding='utf-8', newline='')
+        imported = {}
+        try:
+            totals = import_rows(
+                stream, input_format, options['model'],
+                options['batch_size'], options['ignore_conflicts'], imported)
+        except ValueError as error:
+            raise CommandError(error)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        if not options['skip_rebuild']:
+            rebuild_derived(imported)
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{name} {total}' for name, total in totals.items())))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feeds import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок из таблицы Follow'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, чью ленту нужно пересобрать '
+                 '(можно указать несколько раз)',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_feeds(options['user_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Лент пересобрано, подписок: {total}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс по всем постам'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковый индекс пересобран, постов: {total}'))
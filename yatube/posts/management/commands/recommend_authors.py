@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import recommend
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «кого почитать» по подпискам и '
+            'комментариям; без --full — только для затронутых '
+            'изменениями пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='пересчитать рекомендации всем пользователям',
+        )
+
+    def handle(self, *args, **options):
+        total, full = recommend(full=options['full'])
+        kind = 'полный' if full else 'по изменениям'
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации пересчитаны ({kind}), пользователей: {total}'))
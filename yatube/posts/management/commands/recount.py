@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.comments import backfill_paths
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, комментариев, '
+            'подписчиков и подписок и строит пути старым комментариям')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            paths = backfill_paths()
+            total = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, пользователей: {total}, '
+            f'путей комментариев построено: {paths}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import rebuild, renormalize
+
+
+class Command(BaseCommand):
+    help = ('Переносит начало отсчёта популярности постов на текущий момент '
+            'и удаляет остывшие посты; запускать периодически, например '
+            'раз в сутки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='пересчитать популярность с нуля по постам и комментариям',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            total = rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Популярность пересчитана, постов: {total}'))
+            return
+        total, deleted = renormalize()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность перенормирована, постов: {total}, '
+            f'удалено остывших: {deleted}'))
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.notifications import CLAIM_BATCH_SIZE, process_batch
+
+
+class Command(BaseCommand):
+    help = ('Разбирает outbox уведомлений в нескольких потоках: '
+            'раскладывает уведомления и отправляет письма')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.BACKGROUND_WORKERS,
+            help='число потоков',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=CLAIM_BATCH_SIZE,
+            help='событий, которые поток берёт за раз',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='пауза в секундах, когда outbox пуст',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='разобрать outbox и завершиться',
+        )
+
+    def work(self, stop, options):
+        processed = 0
+        try:
+            while not stop.is_set():
+                batch = process_batch(options['batch_size'])
+                processed += batch
+                if not batch:
+                    if options['once']:
+                        break
+                    stop.wait(options['interval'])
+        finally:
+            # у каждого потока свои соединения с БД
+            connections.close_all()
+        return processed
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [
+                executor.submit(self.work, stop, options)
+                for _ in range(options['workers'])
+            ]
+            try:
+                total = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                stop.set()
+                total = sum(future.result() for future in futures)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано событий: {total}'))
@@ -0,0 +1,161 @@
+"""Учёт ссылок постов на файлы картинок и сборка мусора.
+
+Картинки лежат в хранилище по хешу содержимого (core.storage), поэтому
+один файл может принадлежать нескольким постам. В MediaFile хранится
+число ссылок на каждый файл: сигналы posts.signals и фоновая обработка
+картинок (posts.images) увеличивают и уменьшают его через F(). Когда
+ссылок не остаётся, файл вместе с миниатюрами удаляется в фоновом пуле.
+
+Повторная загрузка того же содержимого находит файл в хранилище раньше,
+чем пост отметит на него ссылку. Чтобы удаление не успело проскочить
+между этими шагами, хранилище сначала бронирует файл (reserve), а
+delete_files удаляет строку MediaFile одним условным DELETE — только если
+ссылок нет и брони тоже — и лишь после этого, в той же транзакции,
+удаляет файлы. Бронь, начатая позже, найдёт файл удалённым, и хранилище
+запишет его заново.
+Команда collect_media пересчитывает ссылки и подбирает файлы, которые
+выпали из учёта (например, загрузки из неудавшихся запросов).
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core.storage import is_content_name
+from core.tasks import defer
+
+from .models import MediaFile, Post
+from .thumbnails import THUMBNAIL_DIR, thumbnail_names
+
+# Файлы моложе этого возраста сборщик не трогает: они могут принадлежать
+# загрузке, пост для которой ещё не сохранён
+ORPHAN_GRACE_SECONDS = 60 * 60
+# Сколько держится бронь файла, найденного повторной загрузкой
+RESERVE_SECONDS = 60
+
+
+def reserve(name):
+    """Бронирует файл, который загрузка вот-вот переиспользует."""
+    until = timezone.now() + timedelta(seconds=RESERVE_SECONDS)
+    files = MediaFile.objects.filter(name=name)
+    if files.update(reserved_until=until):
+        return
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, reserved_until=until)
+    except IntegrityError:
+        files.update(reserved_until=until)
+
+
+def unreserve(name):
+    MediaFile.objects.filter(name=name).update(reserved_until=None)
+
+
+def acquire(name):
+    """Отмечает ещё одну ссылку поста на файл и снимает бронь."""
+    if not name:
+        return
+    files = MediaFile.objects.filter(name=name)
+    if files.update(references=F('references') + 1, reserved_until=None):
+        return
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        files.update(references=F('references') + 1, reserved_until=None)
+
+
+def release(name):
+    """Снимает ссылку на файл; последняя снятая ссылка удаляет файл."""
+    if not name:
+        return
+    files = MediaFile.objects.filter(name=name)
+    files.filter(references__gt=0).update(references=F('references') - 1)
+    if is_content_name(name) and files.filter(references=0).exists():
+        defer(delete_files, name)
+
+
+def replace(old_name, new_name):
+    if old_name == new_name:
+        return
+    acquire(new_name)
+    release(old_name)
+
+
+def delete_files(name):
+    """Удаляет файл и миниатюры, если на него никто не сослался и не
+    забронировал."""
+    with transaction.atomic():
+        deleted, _ = MediaFile.objects.filter(
+            Q(reserved_until=None) | Q(reserved_until__lt=timezone.now()),
+            name=name, references=0,
+        ).delete()
+        if not deleted and MediaFile.objects.filter(name=name).exists():
+            return
+        Post.image.field.storage.delete(name)
+        for thumbnail in thumbnail_names(name):
+            default_storage.delete(thumbnail)
+
+
+def _walk(storage, directory):
+    """Имена всех файлов под directory в хранилище."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for file_name in files:
+        yield f'{directory}/{file_name}'
+    for subdirectory in directories:
+        yield from _walk(storage, f'{directory}/{subdirectory}')
+
+
+def recount_references(dry_run=False, names=None):
+    """Пересчитывает MediaFile по фактическим картинкам постов.
+
+    names — выборка имён файлов, если пересчитать нужно только их.
+    Возвращает словарь «имя файла — число ссылок».
+    """
+    posts = Post.objects.exclude(image='')
+    files = MediaFile.objects.all()
+    if names is not None:
+        posts = posts.filter(image__in=names)
+        files = files.filter(name__in=names)
+    references = dict(
+        posts.values_list('image').annotate(total=Count('pk')).order_by())
+    if not dry_run:
+        with transaction.atomic():
+            files.exclude(name__in=references).delete()
+            for name, total in references.items():
+                MediaFile.objects.update_or_create(
+                    name=name, defaults={'references': total})
+    return references
+
+
+def collect_garbage(dry_run=False, grace=ORPHAN_GRACE_SECONDS):
+    """Пересчитывает ссылки и удаляет файлы, на которые не ссылаются посты.
+
+    Возвращает пару (число удалённых файлов, освобождённые байты).
+    """
+    upload_to = Post.image.field.upload_to.rstrip('/')
+    storage = Post.image.field.storage
+    references = recount_references(dry_run)
+    kept = set()
+    for name in references:
+        kept.add(name)
+        kept.update(thumbnail_names(name))
+    deadline = time.time() - grace
+    removed = freed = 0
+    for directory, files_storage in (
+            (upload_to, storage), (THUMBNAIL_DIR, default_storage)):
+        for name in list(_walk(files_storage, directory)):
+            path = files_storage.path(name)
+            if name in kept or os.path.getmtime(path) > deadline:
+                continue
+            removed += 1
+            freed += os.path.getsize(path)
+            if not dry_run:
+                files_storage.delete(name)
+    return removed, freed
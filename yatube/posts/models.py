@@ -1,19 +1,94 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 FIRST_TEXT_STR_15 = 15
+COMMENT_PATH_SEPARATOR = '.'
 
 User = get_user_model()
 
+# Поля, которые читают карточки постов в лентах (posts/includes/article.html)
+POST_FEED_FIELDS = (
+    'text', 'pub_date', 'image', 'image_width', 'image_height',
+    'thumbnails_ready', 'thumbnails_webp', 'comments_count',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+
+
+# Поля, которые читают комментарии на странице поста и в API
+COMMENT_FIELDS = (
+    'text', 'created', 'post_id', 'parent_id', 'path', 'replies_count',
+    'author__username', 'author__first_name', 'author__last_name',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним JOIN, только нужные поля."""
+        return self.select_related('author', 'group').only(*POST_FEED_FIELDS)
+
+    def for_detail(self):
+        """Пост для отдельной страницы вместе со счётчиками автора."""
+        return self.select_related('author__counters', 'group')
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_post(self, post):
+        """Комментарии поста с авторами без запроса на каждый комментарий."""
+        return self.filter(post=post).select_related('author').only(
+            *COMMENT_FIELDS).order_by('created', 'id')
+
+
+class FeedItemQuerySet(models.QuerySet):
+    def for_feed(self, user):
+        """Лента подписок пользователя с данными для карточек постов."""
+        return self.filter(user=user).select_related(
+            'post__author', 'post__group'
+        ).only('pub_date', 'post', *(
+            f'post__{field}' for field in POST_FEED_FIELDS))
+
+
+class TrendingScoreQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Популярные посты с данными для карточек."""
+        return self.select_related('post__author', 'post__group').only(
+            'score', 'post', *(f'post__{field}' for field in POST_FEED_FIELDS))
+
 
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста', help_text='Введите текст поста')
     pub_date = models.DateTimeField(verbose_name='Дата публикации', auto_now_add=True,)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='related_author_of_posts', verbose_name='Автор',)
     group = models.ForeignKey('Group', on_delete=models.SET_NULL, related_name='related_posts_in_group', blank=True, null=True, verbose_name='Сообщество',help_text='Выберите группу')
-    image = models.ImageField(verbose_name='Картинка', upload_to='posts/',blank=True, )
+    image = models.ImageField(verbose_name='Картинка', upload_to='posts/', storage=ContentAddressedStorage(reserve='posts.media.reserve'), blank=True, )
+    comments_count = models.PositiveIntegerField(verbose_name='Число комментариев', default=0, editable=False)
+    image_width = models.PositiveIntegerField(verbose_name='Ширина картинки', blank=True, null=True, editable=False)
+    image_height = models.PositiveIntegerField(verbose_name='Высота картинки', blank=True, null=True, editable=False)
+    thumbnails_ready = models.BooleanField(verbose_name='Миниатюры готовы', default=False, editable=False)
+    thumbnails_webp = models.BooleanField(verbose_name='Есть миниатюры WebP', default=False, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
+        # Индексы повторяют сортировку лент (posts.utils.FEED_ORDERING),
+        # чтобы страница читалась по индексу без сортировки
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -39,14 +114,40 @@ class Comment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments', verbose_name='Автор комментария', help_text='Выберите автора комментария')
     text = models.TextField(verbose_name='Текст комментария', help_text='Введите текст комментария')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания комментария', help_text='Введите дату')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='replies', blank=True, null=True, verbose_name='Ответ на комментарий')
+    # Материализованный путь: id предков и самого комментария (posts.comments)
+    path = models.CharField(max_length=255, blank=True, editable=False, verbose_name='Путь в ветке')
+    replies_count = models.PositiveIntegerField(verbose_name='Число ответов', default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['post', 'parent', 'created', 'id'],
+                name='comment_post_root_idx'
+            ),
+            # ветка комментария — диапазон путей с его путём в начале
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx'
+            ),
+        ]
         verbose_name = 'Коментарий'
         verbose_name_plural = 'Коментарии'
 
     def __str__(self):
         return self.text
 
+    @property
+    def depth(self):
+        """Уровень вложенности: 0 у комментария к самому посту."""
+        return self.path.count(COMMENT_PATH_SEPARATOR)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower', verbose_name='Подписчик')
@@ -59,8 +160,293 @@ class Follow(models.Model):
                 name='unique follow'
             ),
         ]
+        # (user, author) покрывает уникальное ограничение, а подписчиков
+        # автора для рассылки в ленты этот индекс отдаёт без чтения таблицы
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
 
     def __str__(self):
         return f"Подписчик: {self.user}, Автор : {self.author}"
+
+
+class FollowChange(models.Model):
+    """Журнал подписок и отписок для синхронизации графа в памяти.
+
+    Пишется сигналами posts.signals; процессы дочитывают его с последней
+    применённой записи (posts.graph). Пользователи хранятся числами без
+    внешних ключей: удаление пользователя не должно стирать журнал.
+    """
+    user_id = models.BigIntegerField(verbose_name='Подписчик')
+    author_id = models.BigIntegerField(verbose_name='Автор')
+    followed = models.BooleanField(verbose_name='Подписка', default=True)
+    created = models.DateTimeField(verbose_name='Дата', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Изменение подписок'
+        verbose_name_plural = 'Журнал подписок'
+
+    def __str__(self):
+        action = 'подписался на' if self.followed else 'отписался от'
+        return f'{self.user_id} {action} {self.author_id}'
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами posts.signals через F-выражения; команда
+    recount пересчитывает их заново, если значения разошлись.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters', verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(verbose_name='Число постов', default=0)
+    followers_count = models.PositiveIntegerField(verbose_name='Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField(verbose_name='Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок.
+
+    Заполняется при публикации поста (fan-out на подписчиков автора) и при
+    подписке; удаляется при отписке. Лента читается по индексу
+    (user, -pub_date) без JOIN через Follow.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_items', verbose_name='Читатель ленты')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_items', verbose_name='Пост')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedItemQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed item'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_item_user_pub_date_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f'Лента {self.user}: {self.post}'
+
+
+class SearchToken(models.Model):
+    """Запись инвертированного индекса: основа слова и пост, где она есть."""
+    token = models.CharField(max_length=64, verbose_name='Основа слова')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_tokens', verbose_name='Пост')
+    weight = models.PositiveSmallIntegerField(verbose_name='Частота в тексте', default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['token', 'post'],
+                name='search_token_post_idx'
+            ),
+        ]
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+
+    def __str__(self):
+        return f'{self.token}: {self.post_id}'
+
+
+class MediaFile(models.Model):
+    """Файл в хранилище по хешу содержимого и число постов, которые на него ссылаются.
+
+    Ведётся сигналами posts.signals и фоновой обработкой картинок; когда
+    ссылок не остаётся и файл не занят загрузкой, файл и его миниатюры
+    удаляются (posts.media).
+    """
+    name = models.CharField(max_length=255, primary_key=True, verbose_name='Имя файла')
+    references = models.PositiveIntegerField(verbose_name='Число ссылок', default=0)
+    reserved_until = models.DateTimeField(verbose_name='Занят загрузкой до', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class OutboxEvent(models.Model):
+    """Событие для рассылки уведомлений, записанное в той же транзакции.
+
+    Запрос только добавляет строку; уведомления по ней рассылают воркеры
+    posts.notifications. Пока строка не обработана, она переживает и
+    падение процесса: воркер забирает её заново, когда истечёт аренда.
+    """
+    POST_CREATED = 'post_created'
+    COMMENT_CREATED = 'comment_created'
+    KINDS = (
+        (POST_CREATED, 'Новый пост'),
+        (COMMENT_CREATED, 'Новый комментарий'),
+    )
+
+    kind = models.CharField(max_length=32, choices=KINDS, verbose_name='Тип события')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='outbox_events', verbose_name='Пост')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='outbox_events', blank=True, null=True, verbose_name='Комментарий')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Дата события')
+    claimed_by = models.CharField(max_length=32, blank=True, verbose_name='Воркер')
+    claimed_until = models.DateTimeField(blank=True, null=True, verbose_name='Аренда до')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    processed = models.DateTimeField(blank=True, null=True, verbose_name='Обработано')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['processed', 'id'],
+                name='outbox_pending_idx'
+            ),
+        ]
+        verbose_name = 'Событие для уведомлений'
+        verbose_name_plural = 'События для уведомлений'
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.post_id}'
+
+
+class Notification(models.Model):
+    """Уведомление пользователя о новом посте автора или комментарии."""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', verbose_name='Получатель')
+    event = models.ForeignKey(OutboxEvent, on_delete=models.SET_NULL, related_name='notifications', blank=True, null=True, verbose_name='Событие')
+    kind = models.CharField(max_length=32, choices=OutboxEvent.KINDS, verbose_name='Тип')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='notifications', verbose_name='Пост')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='notifications', blank=True, null=True, verbose_name='Комментарий')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Дата')
+    is_read = models.BooleanField(default=False, verbose_name='Прочитано')
+
+    class Meta:
+        constraints = [
+            # повторная обработка события не размножает уведомления
+            models.UniqueConstraint(
+                fields=['event', 'recipient'],
+                name='unique notification'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipient', '-created'],
+                name='notification_recipient_idx'
+            ),
+        ]
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+
+    def __str__(self):
+        return f'{self.recipient}: {self.get_kind_display()}'
+
+
+class TrendingScore(models.Model):
+    """Популярность поста, затухающая со временем.
+
+    score — сумма весов событий поста (публикация, комментарии), каждый
+    умножен на exp((время события - TrendingEpoch.started) / tau). Общий
+    множитель у всех строк один, поэтому порядок по score совпадает с
+    порядком по текущей затухшей популярности, а новое событие просто
+    прибавляется к score. Ведётся сигналами, см. posts.trending.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending', verbose_name='Пост')
+    score = models.FloatField(verbose_name='Популярность', default=0)
+
+    objects = TrendingScoreQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-score', '-post_id')
+        indexes = [
+            models.Index(
+                fields=['-score', '-post'],
+                name='trending_score_idx'
+            ),
+        ]
+        verbose_name = 'Популярность поста'
+        verbose_name_plural = 'Популярность постов'
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
+
+
+class TrendingEpoch(models.Model):
+    """Момент, к которому приведены все TrendingScore.score.
+
+    Одна строка; её сдвигает команда renormalize_trending.
+    """
+    started = models.DateTimeField(verbose_name='Начало отсчёта')
+
+    class Meta:
+        verbose_name = 'Начало отсчёта популярности'
+        verbose_name_plural = 'Начало отсчёта популярности'
+
+    def __str__(self):
+        return f'{self.started:%Y-%m-%d %H:%M}'
+
+
+class Recommendation(models.Model):
+    """Автор, на которого стоит подписаться пользователю.
+
+    Считается офлайн командой recommend_authors (posts.recommendations)
+    и читается одним запросом по индексу (user, -score).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations', verbose_name='Пользователь')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommended_to', verbose_name='Рекомендуемый автор')
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        ordering = ('-score', 'author_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique recommendation'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='recommendation_user_score_idx'
+            ),
+        ]
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+
+    def __str__(self):
+        return f'{self.user_id} → {self.author_id}: {self.score:.3f}'
+
+
+class RecommendationRun(models.Model):
+    """Прогон recommend_authors и докуда он прочитал журналы.
+
+    Следующий прогон пересчитывает только пользователей, чьи подписки или
+    комментарии изменились после follow_change_id и comment_id.
+    """
+    created = models.DateTimeField(verbose_name='Дата', auto_now_add=True)
+    follow_change_id = models.BigIntegerField(verbose_name='Последняя запись журнала подписок', default=0)
+    comment_id = models.BigIntegerField(verbose_name='Последний комментарий', default=0)
+    users = models.PositiveIntegerField(verbose_name='Пересчитано пользователей', default=0)
+    full = models.BooleanField(verbose_name='Полный прогон', default=False)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Прогон рекомендаций'
+        verbose_name_plural = 'Прогоны рекомендаций'
+
+    def __str__(self):
+        return f'{self.created:%Y-%m-%d %H:%M}: {self.users}'
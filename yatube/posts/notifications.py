@@ -0,0 +1,181 @@
+"""Уведомления о новых постах и комментариях через outbox в базе.
+
+Запрос, создавший пост или комментарий, только добавляет строку
+OutboxEvent в своей же транзакции — одна вставка, и ответ не ждёт
+рассылки. Рассылку делают потоки команды run_workers: забирают пачку
+событий в аренду, раскладывают уведомления получателям — подписчикам
+автора поста или автору комментируемого поста — пачками bulk_create и
+отмечают события обработанными в одной транзакции. Письма по записанным
+уведомлениям уходят уже после COMMIT пачками через одно соединение
+EMAIL_BACKEND: SMTP не держит открытую транзакцию, а с ней и блокировку
+записи SQLite.
+
+Уведомления в базе появляются ровно один раз: если воркер упал до
+COMMIT, событие обработается снова, а уникальность по событию и
+получателю не даст дублей. Письма отправляются не больше одного раза:
+если воркер упал или SMTP ответил ошибкой после COMMIT, письма по этой
+пачке пропадут, уведомления на сайте останутся.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Follow, Notification, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH_SIZE = 100
+WRITE_BATCH_SIZE = 500
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 5
+EMAIL_TEXT_LENGTH = 200
+
+
+def enqueue(kind, post, comment=None):
+    """Записывает событие в outbox; рассылает его воркер."""
+    OutboxEvent.objects.create(kind=kind, post=post, comment=comment)
+
+
+def claim(batch_size=CLAIM_BATCH_SIZE):
+    """Берёт в аренду пачку необработанных событий.
+
+    Условный UPDATE отдаёт каждое событие только одному воркеру: строку,
+    которую успел забрать другой, условие уже не пропустит.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    available = OutboxEvent.objects.filter(
+        Q(claimed_until=None) | Q(claimed_until__lt=now),
+        processed=None, attempts__lt=MAX_ATTEMPTS)
+    ids = list(available.order_by('id').values_list(
+        'id', flat=True)[:batch_size])
+    if not ids:
+        return token, []
+    available.filter(pk__in=ids).update(
+        claimed_by=token,
+        claimed_until=now + timedelta(seconds=LEASE_SECONDS),
+        attempts=F('attempts') + 1)
+    events = OutboxEvent.objects.filter(
+        pk__in=ids, claimed_by=token
+    ).select_related('post__author', 'comment__author').order_by('id')
+    return token, list(events)
+
+
+def _recipients(event):
+    if event.kind == OutboxEvent.COMMENT_CREATED:
+        if event.comment.author_id != event.post.author_id:
+            yield event.post.author_id
+        return
+    yield from Follow.objects.filter(
+        author_id=event.post.author_id
+    ).values_list('user_id', flat=True).iterator()
+
+
+def _message(event, address):
+    post = event.post
+    if event.kind == OutboxEvent.COMMENT_CREATED:
+        subject = (f'{event.comment.author.username} прокомментировал '
+                   f'ваш пост')
+        text = event.comment.text
+    else:
+        subject = f'Новый пост {post.author.username}'
+        text = post.text
+    url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+    return EmailMessage(
+        subject, f'{text[:EMAIL_TEXT_LENGTH]}\n\n{url}', to=[address])
+
+
+def _flush(buffer):
+    """Пишет накопленные уведомления."""
+    Notification.objects.bulk_create(buffer, ignore_conflicts=True)
+    written = len(buffer)
+    buffer.clear()
+    return written
+
+
+def deliver(events):
+    """Раскладывает уведомления по событиям; возвращает их число."""
+    buffer = []
+    total = 0
+    for event in events:
+        for recipient_id in _recipients(event):
+            buffer.append(Notification(
+                recipient_id=recipient_id, event=event, kind=event.kind,
+                post_id=event.post_id, comment_id=event.comment_id,
+            ))
+            if len(buffer) >= WRITE_BATCH_SIZE:
+                total += _flush(buffer)
+    return total + _flush(buffer)
+
+
+def send_emails(events):
+    """Отправляет письма по уведомлениям событий; возвращает их число."""
+    by_id = {event.pk: event for event in events}
+    addresses = Notification.objects.filter(
+        event_id__in=list(by_id)
+    ).exclude(recipient__email='').order_by('pk').values_list(
+        'event_id', 'recipient__email')
+    sent = 0
+    connection = get_connection()
+    with connection:
+        messages = []
+        for event_id, address in addresses.iterator():
+            messages.append(_message(by_id[event_id], address))
+            if len(messages) >= WRITE_BATCH_SIZE:
+                sent += connection.send_messages(messages) or 0
+                messages = []
+        if messages:
+            sent += connection.send_messages(messages) or 0
+    return sent
+
+
+def process_batch(batch_size=CLAIM_BATCH_SIZE):
+    """Обрабатывает одну пачку событий; возвращает число взятых событий.
+
+    При ошибке до COMMIT события остаются в аренде до её конца и затем
+    берутся заново, пока не кончатся MAX_ATTEMPTS попыток.
+    """
+    token, events = claim(batch_size)
+    claimed = len(events)
+    if not claimed:
+        return 0
+    try:
+        with transaction.atomic():
+            # отметка идёт первой: на SQLite первая запись ставит транзакцию
+            # в очередь, и чтение подписчиков не видит устаревший снимок
+            marked = OutboxEvent.objects.filter(
+                pk__in=[event.pk for event in events], claimed_by=token
+            ).update(processed=timezone.now(), claimed_until=None)
+            deliver(events)
+    except Exception:
+        logger.exception('Не удалось разослать уведомления по %s событиям',
+                         claimed)
+        return claimed
+    if marked < claimed:
+        # аренда истекла, и часть событий забрал другой воркер: письма по
+        # ним отправит он
+        events = list(OutboxEvent.objects.filter(
+            pk__in=[event.pk for event in events], claimed_by=token
+        ).select_related('post__author', 'comment__author'))
+    try:
+        send_emails(events)
+    except Exception:
+        logger.exception('Не удалось отправить письма по %s событиям',
+                         len(events))
+    return claimed
+
+
+def drain(batch_size=CLAIM_BATCH_SIZE):
+    """Разбирает outbox, пока в нём есть доступные события."""
+    total = 0
+    while True:
+        processed = process_batch(batch_size)
+        if not processed:
+            return total
+        total += processed
@@ -0,0 +1,198 @@
+"""Рекомендации «кого почитать», посчитанные офлайн.
+
+Оценка автора a для пользователя u складывается из двух разреженных
+произведений матриц, которые считаются по строке на пользователя, как
+построчное умножение CSR-матриц:
+
+* друзья друзей — (F·F)[u, a], где F — матрица подписок: сколько авторов
+  из подписок u сами подписаны на a;
+* похожие комментаторы — косинусная близость строк u и a матрицы C
+  «пользователь × пост, который он комментировал», то есть
+  (C·Cᵀ)[u, a] / sqrt(|C[u]| · |C[a]|).
+
+Матрицы лежат в CSR-массивах posts.graph.Adjacency по 8 байт на ненулевой
+элемент, и на миллионы подписок и комментариев уходят десятки мегабайт.
+Строка-аккумулятор живёт только для одного пользователя, а вершины со
+степенью больше MAX_FANOUT (подписки на всех подряд, посты с тысячами
+комментаторов) пропускаются: их строки плотные и мало что говорят, а
+время и память на пользователя они раздули бы больше всего. По той же
+причине из собственных подписок и обсуждений пользователя берутся не
+больше MAX_FANOUT самых разреженных.
+
+Результат — TOP_K авторов на пользователя в таблице Recommendation, так
+что страница читает их одним запросом по индексу. Повторный прогон
+пересчитывает только пользователей, у которых изменились подписки,
+подписки их подписок или обсуждения (по журналу FollowChange и новым
+комментариям); если журнал мог быть обрезан, прогон полный. Записи с
+меньшим id могут зафиксироваться позже границы прошлого прогона, поэтому
+оба журнала перечитываются с запасом в SYNC_WINDOW id.
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .graph import (BUILD_CHUNK_SIZE, CHANGES_KEEP, RESET_USER_ID,
+                    SYNC_WINDOW, Adjacency, FollowGraph)
+from .models import (Comment, FollowChange, Post, Recommendation,
+                     RecommendationRun, User)
+
+TOP_K = 5
+FOLLOW_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+MAX_FANOUT = 1000
+USERS_BATCH_SIZE = 500
+WRITE_BATCH_SIZE = 1000
+
+
+def _sparsest(adjacency, node, degrees):
+    """Соседи вершины; у плотной — MAX_FANOUT соседей с меньшей степенью."""
+    neighbours = adjacency.neighbours(node)
+    if len(neighbours) <= MAX_FANOUT:
+        return neighbours
+    return heapq.nsmallest(MAX_FANOUT, neighbours, key=degrees.degree)
+
+
+class Matrices:
+    """Разреженные матрицы подписок и комментариев для одного прогона."""
+
+    def __init__(self):
+        graph = FollowGraph()
+        graph.build()
+        self.following = graph.following
+        self.followers = graph.followers
+        comments = Comment.objects.values_list(
+            'author_id', 'post_id').distinct()
+        self.commented = Adjacency(comments.order_by(
+            'author_id', 'post_id').iterator(chunk_size=BUILD_CHUNK_SIZE))
+        self.commenters = Adjacency(
+            (post_id, author_id) for author_id, post_id in comments.order_by(
+                'post_id', 'author_id').iterator(chunk_size=BUILD_CHUNK_SIZE))
+        authors = Post.objects.order_by('author_id').values_list(
+            'author_id', flat=True).distinct()
+        self.authors = array(
+            'q', authors.iterator(chunk_size=BUILD_CHUNK_SIZE))
+
+    def is_author(self, user_id):
+        index = bisect_left(self.authors, user_id)
+        return index < len(self.authors) and self.authors[index] == user_id
+
+    def scores(self, user_id):
+        """Строка оценок пользователя: {автор: оценка}."""
+        scores = defaultdict(float)
+        for friend in _sparsest(self.following, user_id, self.following):
+            if self.following.degree(friend) > MAX_FANOUT:
+                continue
+            for author in self.following.neighbours(friend):
+                scores[author] += FOLLOW_WEIGHT
+        posts = self.commented.neighbours(user_id)
+        overlap = defaultdict(int)
+        for post in _sparsest(self.commented, user_id, self.commenters):
+            if self.commenters.degree(post) > MAX_FANOUT:
+                continue
+            for other in self.commenters.neighbours(post):
+                overlap[other] += 1
+        for other, common in overlap.items():
+            scores[other] += COMMENT_WEIGHT * common / math.sqrt(
+                len(posts) * self.commented.degree(other))
+        return scores
+
+    def top(self, user_id, k=TOP_K):
+        """k лучших авторов, на которых пользователь ещё не подписан."""
+        candidates = (
+            (author, score)
+            for author, score in self.scores(user_id).items()
+            if author != user_id and self.is_author(author)
+            and not self.following.contains(user_id, author)
+        )
+        return heapq.nlargest(k, candidates, key=itemgetter(1))
+
+    def changed_users(self, run):
+        """Пользователи, чьи оценки могли измениться после прогона run.
+
+        None, если по журналу этого не узнать и нужен полный прогон.
+        """
+        users = set()
+        changes = FollowChange.objects.filter(
+            pk__gt=run.follow_change_id - SYNC_WINDOW
+        ).values_list('user_id', flat=True)
+        for user_id in changes.iterator():
+            if user_id == RESET_USER_ID:
+                return None
+            # подписки user_id входят в «друзей друзей» его подписчиков
+            users.add(user_id)
+            users.update(self.followers.neighbours(user_id))
+        posts = Comment.objects.filter(
+            pk__gt=run.comment_id - SYNC_WINDOW
+        ).values_list('post_id', flat=True)
+        for post_id in posts.distinct().iterator():
+            users.update(self.commenters.neighbours(post_id))
+        return users
+
+
+def _store(results):
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=list(results)).delete()
+        Recommendation.objects.bulk_create(
+            (
+                Recommendation(user_id=user_id, author_id=author_id,
+                               score=score)
+                for user_id, top in results.items()
+                for author_id, score in top
+            ),
+            batch_size=WRITE_BATCH_SIZE,
+        )
+
+
+def recommend(full=False):
+    """Пересчитывает рекомендации; возвращает (число пользователей, full).
+
+    Без full пересчитываются только пользователи, затронутые изменениями
+    после прошлого прогона.
+    """
+    # границы журналов берутся до чтения данных: то, что изменится во
+    # время прогона, следующий прогон пересчитает ещё раз
+    bounds = {
+        'follow_change_id': FollowChange.objects.aggregate(
+            last=Max('pk'))['last'] or 0,
+        'comment_id': Comment.objects.aggregate(last=Max('pk'))['last'] or 0,
+    }
+    last = RecommendationRun.objects.first()
+    matrices = Matrices()
+    users = None
+    if not full and last and (
+            last.created >= timezone.now() - CHANGES_KEEP):
+        users = matrices.changed_users(last)
+    full = users is None
+    if full:
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        users = users.iterator(chunk_size=USERS_BATCH_SIZE)
+    else:
+        users = iter(sorted(users))
+    total = 0
+    while True:
+        batch = list(islice(users, USERS_BATCH_SIZE))
+        if not batch:
+            break
+        _store({user_id: matrices.top(user_id) for user_id in batch})
+        total += len(batch)
+    RecommendationRun.objects.create(users=total, full=full, **bounds)
+    return total, full
+
+
+def recommended_authors(user, limit=TOP_K):
+    """Авторы для блока «Кого почитать» одним запросом."""
+    if not user.is_authenticated:
+        return []
+    recommendations = Recommendation.objects.filter(user=user).exclude(
+        author__following__user=user
+    ).select_related('author').only(
+        'author__username', 'author__first_name', 'author__last_name')
+    return [item.author for item in recommendations[:limit]]
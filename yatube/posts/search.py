@@ -0,0 +1,193 @@
+"""Полнотекстовый поиск по постам на собственном инвертированном индексе.
+
+Текст поста разбивается на слова, русские слова приводятся к основе
+стеммером Портера (Snowball) для русского языка, и в таблицу SearchToken
+пишется пара (основа, пост) с частотой основы в тексте. Поиск по запросу
+сводится к индексному `token IN (...)` и ранжированию по TF-IDF.
+"""
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from .models import Post, SearchToken
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'^[а-я]+$')
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 10
+INDEX_BATCH_SIZE = 1000
+DOCUMENTS_COUNT_CACHE_KEY = 'search_documents_count'
+DOCUMENTS_COUNT_TIMEOUT = 60 * 5
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (('вшись', 'вши', 'в'),
+                     ('ывшись', 'ившись', 'ывши', 'ивши', 'ыв', 'ив'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей',
+    'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая',
+    'яя', 'ою', 'ею',
+)
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'й', 'л', 'н'),
+    ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло',
+     'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл',
+     'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье',
+    'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию',
+    'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _region(word, start=0):
+    """Начало области после первой пары «гласная + согласная»."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, start, endings):
+    """Отрезает самое длинное окончание, целиком лежащее после start.
+
+    endings — пара (окончания после «а»/«я», прочие окончания).
+    Возвращает укороченное слово или None, если окончание не найдено.
+    """
+    after_a, plain = endings
+    candidates = [(ending, True) for ending in after_a]
+    candidates += [(ending, False) for ending in plain]
+    candidates.sort(key=lambda item: len(item[0]), reverse=True)
+    for ending, needs_a in candidates:
+        position = len(word) - len(ending)
+        if position < start or not word.endswith(ending):
+            continue
+        if needs_a:
+            if position - 1 < start or word[position - 1] not in 'ая':
+                continue
+        return word[:position]
+    return None
+
+
+def _strip_adjectival(word, start):
+    stem = _strip(word, start, ((), ADJECTIVE))
+    if stem is None:
+        return None
+    return _strip(stem, start, PARTICIPLE) or stem
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball; прочие слова как есть."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.match(word):
+        return word
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS),
+              len(word))
+    r2 = _region(word, _region(word))
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        for strip in (
+                _strip_adjectival,
+                lambda w, s: _strip(w, s, VERB),
+                lambda w, s: _strip(w, s, NOUN)):
+            stemmed = strip(word, rv)
+            if stemmed is not None:
+                break
+    word = word if stemmed is None else stemmed
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    if word.endswith('нн'):
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative[:-1] if superlative.endswith('нн') else superlative
+    elif word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста в порядке появления."""
+    return [
+        stem(word)[:MAX_TOKEN_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+        if len(word) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def index_post(post):
+    """Перестраивает записи индекса для одного поста."""
+    SearchToken.objects.filter(post_id=post.pk).delete()
+    SearchToken.objects.bulk_create(
+        SearchToken(token=token, post_id=post.pk, weight=weight)
+        for token, weight in Counter(tokenize(post.text)).items()
+    )
+
+
+def rebuild_index(posts=None):
+    """Пересобирает индекс по всем постам, возвращает их число.
+
+    posts — выборка id, если пересобрать нужно только часть постов.
+    """
+    tokens = SearchToken.objects.all()
+    rows = Post.objects.all()
+    if posts is not None:
+        tokens = tokens.filter(post_id__in=posts)
+        rows = rows.filter(pk__in=posts)
+    tokens.delete()
+    total = 0
+    batch = []
+    for post_id, text in rows.values_list('id', 'text').iterator():
+        batch.extend(
+            SearchToken(token=token, post_id=post_id, weight=weight)
+            for token, weight in Counter(tokenize(text)).items()
+        )
+        total += 1
+        if len(batch) >= INDEX_BATCH_SIZE:
+            SearchToken.objects.bulk_create(batch)
+            batch = []
+    SearchToken.objects.bulk_create(batch)
+    return total
+
+
+def search_posts(query):
+    """Посты, подходящие под запрос, от самых релевантных.
+
+    Сначала идут посты, совпавшие по большему числу слов запроса, внутри —
+    по сумме TF-IDF, затем более свежие.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return Post.objects.none()
+    documents = cache.get_or_set(
+        DOCUMENTS_COUNT_CACHE_KEY, Post.objects.count,
+        DOCUMENTS_COUNT_TIMEOUT)
+    frequencies = dict(
+        SearchToken.objects.filter(token__in=terms)
+        .values_list('token').annotate(Count('post')).order_by()
+    )
+    if not frequencies:
+        return Post.objects.none()
+    weights = [
+        When(search_tokens__token=token,
+             then=F('search_tokens__weight') * Value(
+                 math.log(1 + documents / frequency)))
+        for token, frequency in frequencies.items()
+    ]
+    return Post.objects.filter(
+        search_tokens__token__in=frequencies
+    ).annotate(
+        matched=Count('search_tokens'),
+        rank=Sum(Case(*weights, output_field=FloatField())),
+    ).order_by('-matched', '-rank', '-pub_date', '-id')
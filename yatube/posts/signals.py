@@ -0,0 +1,123 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.http_cache import purge
+
+from . import (cards, comments, counters, feeds, graph, media, notifications,
+               search, trending)
+from .models import (Comment, Follow, Group, OutboxEvent, Post, User,
+                     UserCounters)
+
+# Поля пользователя, которые выводит карточка поста
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+        cards.invalidate_author_cards(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and not CARD_USER_FIELDS & update_fields):
+        return
+    cards.invalidate_author_cards(instance.pk)
+    purge(f'author-{instance.pk}')
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    cards.invalidate_group_cards(instance.pk)
+    purge(f'group-{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        cards.invalidate_post_card(instance.pk)
+        counters.bump_user(instance.author_id, posts_count=1)
+        feeds.fan_out_post(instance)
+        trending.add_post(instance)
+        notifications.enqueue(OutboxEvent.POST_CREATED, instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw or (update_fields and 'text' not in update_fields):
+        return
+    search.index_post(instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_replacing(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    instance._stored_image = None
+    if raw or not instance.pk or (
+            update_fields and 'image' not in update_fields):
+        return
+    instance._stored_image = Post.objects.filter(
+        pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        media.acquire(instance.image.name)
+    elif instance._stored_image is not None:
+        media.replace(instance._stored_image, instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    media.release(instance.image.name)
+    cards.invalidate_post_card(instance.pk)
+    group_tags = [f'group-{instance.group_id}'] if instance.group_id else []
+    purge(f'post-{instance.pk}', 'index', 'trending',
+          f'author-{instance.author_id}', *group_tags)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        comments.assign_path(instance)
+        counters.bump_comments(instance.post_id, 1)
+        if instance.parent_id is not None:
+            counters.bump_replies(instance.parent_id, 1)
+        trending.add_comment(instance)
+        notifications.enqueue(
+            OutboxEvent.COMMENT_CREATED, instance.post, instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    if instance.parent_id is not None:
+        counters.bump_replies(instance.parent_id, -1)
+    # счётчик комментариев выводится на карточке поста
+    cards.invalidate_post_card(instance.post_id)
+    purge(f'post-{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        feeds.backfill_feed(instance.user_id, instance.author_id)
+        graph.record(instance.user_id, instance.author_id, True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    feeds.prune_feed(instance.user_id, instance.author_id)
+    graph.record(instance.user_id, instance.author_id, False)
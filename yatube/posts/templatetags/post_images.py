@@ -0,0 +1,14 @@
+from django import template
+
+from posts.thumbnails import thumbnail
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, size='feed'):
+    """Картинка поста из готовых миниатюр или исходный файл, пока их нет."""
+    return {
+        'post': post,
+        'thumbnail': thumbnail(post, size),
+    }
@@ -0,0 +1,139 @@
+import warnings
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import comments
+from posts.models import Comment, Post, User
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text=text, parent=parent)
+
+    def test_reply_path_and_counters(self):
+        root = self.comment('Корень')
+        reply = self.comment('Ответ', root)
+        nested = self.comment('Ответ на ответ', reply)
+        self.assertEqual(root.path, str(root.pk).zfill(10))
+        self.assertEqual(
+            nested.path, f'{reply.path}.{str(nested.pk).zfill(10)}')
+        self.assertEqual(nested.depth, 2)
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 1)
+        nested.delete()
+        reply.refresh_from_db()
+        self.assertEqual(reply.replies_count, 0)
+
+    def test_thread_is_one_range_query(self):
+        """Ветка — все потомки комментария в порядке обхода, одним запросом"""
+        first, second = self.comment('Первый'), self.comment('Второй')
+        reply = self.comment('Ответ', first)
+        late_reply = self.comment('Поздний ответ', first)
+        nested = self.comment('Вложенный', reply)
+        self.comment('Чужой ответ', second)
+        with CaptureQueriesContext(connection) as queries:
+            thread = list(comments.thread(first).order_by('path'))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(thread, [reply, nested, late_reply])
+
+    def test_deep_replies_attach_to_last_level(self):
+        parent = self.comment('0')
+        for level in range(1, comments.MAX_DEPTH + 3):
+            parent = self.comment(
+                str(level), comments.reply_parent(parent))
+        self.assertEqual(parent.depth, comments.MAX_DEPTH - 1)
+        self.assertLessEqual(
+            len(parent.path), Comment._meta.get_field('path').max_length)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                comments.reply_parent(parent).pk, parent.parent_id)
+
+    @mock.patch.object(comments, 'COMMENTS_PER_PAGE', 2)
+    def test_roots_paginated_by_cursor_in_both_orders(self):
+        roots = [self.comment(f'Комментарий {i}') for i in range(3)]
+        self.comment('Ответ', roots[0])
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        for order, expected in (('old', roots), ('new', roots[::-1])):
+            with self.subTest(order=order):
+                response = self.client.get(url, {'order': order})
+                page = response.context['comments']
+                self.assertEqual(list(page), expected[:2])
+                response = self.client.get(
+                    reverse('posts:post_comments',
+                            kwargs={'post_id': self.post.id}),
+                    {'order': order,
+                     'cursor': page.paginator.next_cursor})
+                self.assertEqual(list(response.context['comments']),
+                                 expected[2:])
+
+    def test_fragment_loads_thread(self):
+        root = self.comment('Корень')
+        self.comment('Ответ в ветке', root)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            response = self.client.get(
+                reverse('posts:post_comments',
+                        kwargs={'post_id': self.post.id}),
+                {'thread': root.pk})
+            self.client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertContains(response, 'Ответ в ветке')
+        self.assertNotContains(response, 'Корень')
+        self.assertNotContains(response, '<html')
+
+    def test_add_reply(self):
+        root = self.comment('Корень')
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Ответ', 'parent': root.pk})
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertTrue(reply.path.startswith(root.path + '.'))
+
+    def test_reply_to_other_post_rejected(self):
+        other = Post.objects.create(author=self.user, text='Другой')
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text='Чужой')
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Ответ', 'parent': foreign.pk})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text='Ответ').exists())
+
+    def test_recount_backfills_paths_of_old_comments(self):
+        """Старые комментарии без пути не отвечают и не дают чужих веток,
+        пока recount не построит им пути"""
+        first, second = self.comment('Старый'), self.comment('Тоже старый')
+        reply = self.comment('Ответ', second)
+        Comment.objects.update(path='')
+        first.refresh_from_db()
+        with self.assertRaises(comments.MissingPathError):
+            comments.thread(first)
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Новый ответ', 'parent': first.pk})
+        self.assertEqual(response.status_code, 404)
+        call_command('recount', stdout=StringIO())
+        reply.refresh_from_db()
+        self.assertEqual(
+            reply.path,
+            f'{str(second.pk).zfill(10)}.{str(reply.pk).zfill(10)}')
+        first.refresh_from_db()
+        self.assertEqual(list(comments.thread(first)), [])
@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Post, User, UserCounters
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Создание и удаление поста меняют счётчик постов автора"""
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        Post.objects.create(author=self.author, text='Ещё пост').delete()
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+
+    def test_comment_counter(self):
+        """Комментарий через add_comment увеличивает счётчик поста"""
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Комментарий'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики подписчиков и подписок"""
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': 'author'})
+        self.reader_client.get(follow_url)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}))
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount восстанавливает разошедшиеся счётчики"""
+        Comment.objects.create(post=self.post, author=self.reader, text='К')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.objects.all().delete()
+        Post.objects.update(comments_count=0)
+        call_command('recount', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+
+    def test_profile_uses_stored_counter(self):
+        """Профиль показывает сохранённое значение счётчика"""
+        UserCounters.objects.filter(user=self.author).update(posts_count=42)
+        response = self.reader_client.get(
+            reverse('posts:profile', kwargs={'username': 'author'}))
+        self.assertContains(response, 'Всего постов: 42')
@@ -0,0 +1,134 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import graph
+from posts.models import Follow, FollowChange, Group, Post, User
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_adjacency_lookups(self):
+        """Списки смежности отвечают на принадлежность и соседей"""
+        adjacency = graph.Adjacency([(1, 2), (1, 5), (3, 1), (3, 4)])
+        self.assertTrue(adjacency.contains(1, 5))
+        self.assertFalse(adjacency.contains(1, 4))
+        self.assertFalse(adjacency.contains(2, 1))
+        self.assertEqual(list(adjacency.neighbours(3)), [1, 4])
+        self.assertEqual(list(adjacency.neighbours(7)), [])
+        self.assertEqual(len(adjacency), 4)
+
+    def test_graph_follows_changes(self):
+        """Граф видит подписки и отписки через журнал"""
+        first, second, third = (author.pk for author in self.authors)
+        follow_graph = graph.follow_graph()
+        self.assertEqual(follow_graph.authors_of(self.reader.pk),
+                         [first, second])
+        self.assertFalse(follow_graph.is_following(self.reader.pk, third))
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author2'}))
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author0'}))
+        follow_graph = graph.follow_graph()
+        self.assertTrue(follow_graph.is_following(self.reader.pk, third))
+        self.assertFalse(follow_graph.is_following(self.reader.pk, first))
+        self.assertEqual(follow_graph.authors_of(self.reader.pk),
+                         [second, third])
+        self.assertEqual(follow_graph.followers_of(third), [self.reader.pk])
+
+    def test_graph_rebuilds_after_lost_changes(self):
+        """Пропавший журнал и отметка сброса пересобирают граф"""
+        follow_graph = graph.follow_graph()
+        Follow.objects.bulk_create(
+            [Follow(user=self.authors[2], author=self.reader)])
+        FollowChange.objects.all().delete()
+        self.assertEqual(
+            graph.follow_graph().followers_of(self.reader.pk),
+            [self.authors[2].pk])
+        Follow.objects.bulk_create(
+            [Follow(user=self.authors[1], author=self.reader)])
+        graph.reset()
+        self.assertIs(graph.follow_graph(), follow_graph)
+        self.assertEqual(
+            follow_graph.followers_of(self.reader.pk),
+            [self.authors[1].pk, self.authors[2].pk])
+
+    def test_graph_picks_up_late_commits(self):
+        """Запись журнала, зафиксированная позже записи с большим id,
+        тоже применяется"""
+        follow_graph = graph.follow_graph()
+        last_id = follow_graph.last_change[0]
+        reader, first, third = (
+            self.reader.pk, self.authors[0].pk, self.authors[2].pk)
+        FollowChange.objects.create(
+            pk=last_id + 2, user_id=reader, author_id=third, followed=True)
+        self.assertTrue(follow_graph.sync())
+        FollowChange.objects.create(
+            pk=last_id + 1, user_id=reader, author_id=first, followed=False)
+        self.assertTrue(follow_graph.sync())
+        self.assertEqual(follow_graph.last_change[0], last_id + 2)
+        self.assertEqual(follow_graph.authors_of(reader),
+                         [self.authors[1].pk, third])
+
+    def test_profile_sees_follow_before_graph_sync(self):
+        """Профиль видит подписку, которую граф процесса ещё не догнал"""
+        graph.follow_graph()
+        # подписка из другого процесса: журнал этот процесс прочтёт только
+        # через SYNC_INTERVAL
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.authors[2])])
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author2'}))
+        self.assertTrue(response.context['following'])
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author0'}))
+        self.assertTrue(response.context['following'])
+
+    def test_follow_graph_command_reports_memory(self):
+        """Команда follow_graph печатает размер графа"""
+        out = StringIO()
+        call_command('follow_graph', '--prune', stdout=out)
+        self.assertIn('Подписок: 2', out.getvalue())
+        self.assertIn('МБ', out.getvalue())
+        self.assertTrue(FollowChange.objects.exists())
+
+    def test_feed_cards_show_follow_state(self):
+        """Карточки ленты, группы и страница поста показывают кнопки
+        подписки без запроса на каждого автора"""
+        group = Group.objects.create(title='Группа', slug='group')
+        posts = [
+            Post.objects.create(author=author, group=group, text='Пост')
+            for author in self.authors
+        ]
+        Post.objects.create(author=self.reader, group=group, text='Свой')
+        follow = reverse('posts:profile_follow', args=['author2'])
+        unfollow = reverse('posts:profile_unfollow', args=['author0'])
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=['group'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.context['followed_authors'],
+                    {self.authors[0].pk, self.authors[1].pk})
+                self.assertContains(response, follow, count=1)
+                self.assertContains(response, unfollow, count=1)
+                self.assertNotContains(response, 'profile/reader/follow/')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[posts[2].pk]))
+        self.assertContains(response, follow, count=1)
+        self.assertNotContains(Client().get(reverse('posts:index')), follow)
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts import media, thumbnails
+from posts.models import MediaFile, Post, User
+
+from .test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_ASYNC=False)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, text, image):
+        self.client.post(reverse('posts:post_create'), data={
+            'text': text, 'image': image})
+        return Post.objects.get(text=text)
+
+    def assertStored(self, name, stored=True):
+        storage = Post.image.field.storage
+        self.assertEqual(storage.exists(name), stored)
+        self.assertEqual(default_storage.exists(
+            thumbnails.thumbnail_name(name, 'feed', 'jpg')), stored)
+
+    def test_identical_uploads_share_file_and_thumbnails(self):
+        """Одинаковые картинки хранятся и уменьшаются один раз"""
+        with mock.patch.object(
+                thumbnails, '_build', wraps=thumbnails._build) as build:
+            first = self.create_post('Первый', make_image('one.jpg'))
+            second = self.create_post('Второй', make_image('two.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(build.call_count, 1)
+        self.assertTrue(second.thumbnails_ready)
+        self.assertEqual(
+            MediaFile.objects.get(name=first.image.name).references, 2)
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл и миниатюры удаляются вместе с последним постом"""
+        first = self.create_post('Первый', make_image())
+        second = self.create_post('Второй', make_image())
+        name = first.image.name
+        first.delete()
+        self.assertStored(name)
+        second.delete()
+        self.assertStored(name, stored=False)
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_reused_file_survives_concurrent_delete(self):
+        """Файл, найденный повторной загрузкой, не удаляется, пока пост
+        с ним не отметил ссылку"""
+        post = self.create_post('Первый', make_image())
+        name = post.image.name
+        media.reserve(name)
+        post.delete()
+        self.assertStored(name)
+        media.acquire(name)
+        file = MediaFile.objects.get(name=name)
+        self.assertEqual(file.references, 1)
+        self.assertIsNone(file.reserved_until)
+        media.release(name)
+        self.assertStored(name, stored=False)
+
+    def test_replaced_image_released(self):
+        """Заменённая при редактировании картинка удаляется"""
+        post = self.create_post('Пост', make_image())
+        old_name = post.image.name
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': post.text,
+                  'image': make_image('other.jpg', color='blue')})
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertStored(old_name, stored=False)
+        self.assertStored(post.image.name)
+
+    def test_collect_media_removes_orphans(self):
+        """collect_media удаляет файлы без ссылок и чинит счётчики"""
+        post = self.create_post('Пост', make_image())
+        storage = Post.image.field.storage
+        orphan = storage.save('posts/lost.jpg', ContentFile(b'lost'))
+        MediaFile.objects.filter(name=post.image.name).update(references=7)
+        out = StringIO()
+        call_command('collect_media', grace=0, stdout=out)
+        self.assertIn('Удалено файлов: 1', out.getvalue())
+        self.assertFalse(storage.exists(orphan))
+        self.assertStored(post.image.name)
+        self.assertEqual(
+            MediaFile.objects.get(name=post.image.name).references, 1)
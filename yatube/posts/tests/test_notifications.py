@@ -0,0 +1,173 @@
+import os
+import tempfile
+import threading
+from io import StringIO
+
+from django.apps import apps
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from posts import notifications
+from posts.models import Comment, Follow, Notification, OutboxEvent, Post, User
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.readers = [
+            User.objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@example.com')
+            for i in range(3)
+        ]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        OutboxEvent.objects.all().delete()
+        self.client = Client()
+        self.client.force_login(self.readers[0])
+
+    def test_views_only_enqueue(self):
+        """add_comment пишет событие в outbox, а не рассылает сам"""
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Комментарий'})
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.kind, OutboxEvent.COMMENT_CREATED)
+        self.assertIsNone(event.processed)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_new_post_notifies_followers(self):
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(notifications.drain(), 1)
+        self.assertEqual(
+            set(Notification.objects.filter(post=post).values_list(
+                'recipient', flat=True)),
+            {reader.pk for reader in self.readers})
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [reader.email for reader in self.readers])
+        self.assertIsNotNone(OutboxEvent.objects.get().processed)
+
+    def test_comment_notifies_post_author_only(self):
+        Comment.objects.create(
+            post=self.post, author=self.readers[1], text='Отличный пост')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Спасибо')
+        notifications.drain()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.author)
+        self.assertEqual(notification.kind, OutboxEvent.COMMENT_CREATED)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Отличный пост', mail.outbox[0].body)
+
+    def test_reprocessing_does_not_duplicate(self):
+        Post.objects.create(author=self.author, text='Новый пост')
+        notifications.drain()
+        OutboxEvent.objects.update(processed=None, attempts=0)
+        notifications.drain()
+        self.assertEqual(Notification.objects.count(), len(self.readers))
+
+    @override_settings(
+        EMAIL_BACKEND='posts.tests.test_notifications.FailingEmailBackend')
+    def test_email_failure_keeps_notifications(self):
+        """Ошибка SMTP после COMMIT не откатывает уведомления"""
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(notifications.process_batch(), 1)
+        self.assertEqual(Notification.objects.count(), len(self.readers))
+        self.assertIsNotNone(OutboxEvent.objects.get().processed)
+
+    def test_claimed_events_are_not_taken_twice(self):
+        Post.objects.create(author=self.author, text='Новый пост')
+        _, first = notifications.claim()
+        _, second = notifications.claim()
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+
+
+@override_settings(BACKGROUND_TASKS_ASYNC=False)
+class RunWorkersTests(TransactionTestCase):
+    """Потоки команды разбирают outbox одной базы SQLite в файле с WAL.
+
+    Тестовая база в памяти с общим кэшем не пускает два пишущих соединения
+    одновременно, поэтому тест заводит базу во временном файле и работает
+    с ней из отдельного потока: соединения потоков строятся по
+    connections.databases, а соединение основного потока остаётся с
+    тестовой базой.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        default = connections.databases['default']
+        connections.databases['default'] = dict(
+            default, NAME=os.path.join(directory.name, 'db.sqlite3'))
+        self.addCleanup(connections.databases.__setitem__, 'default', default)
+
+    def run_on_file_database(self, function):
+        result = {}
+
+        def target():
+            try:
+                with connection.schema_editor() as editor:
+                    for model in apps.get_models():
+                        editor.create_model(model)
+                result['value'] = function()
+            except Exception as error:
+                result['error'] = error
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+    def test_run_workers_command(self):
+        def scenario():
+            author = User.objects.create_user(username='author')
+            readers = [
+                User.objects.create_user(username=f'reader{i}')
+                for i in range(2)
+            ]
+            for reader in readers:
+                Follow.objects.create(user=reader, author=author)
+            for number in range(20):
+                Post.objects.create(author=author, text=f'Пост {number}')
+            out = StringIO()
+            call_command('run_workers', '--once', '--workers', '4',
+                         '--batch-size', '3', stdout=out)
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            return (journal_mode, out.getvalue(),
+                    Notification.objects.count(),
+                    OutboxEvent.objects.filter(processed=None).count(),
+                    sorted(OutboxEvent.objects.values_list(
+                        'attempts', flat=True).distinct()),
+                    len(readers))
+
+        journal_mode, out, notified, pending, attempts, readers = (
+            self.run_on_file_database(scenario))
+        self.assertEqual(journal_mode, 'wal')
+        self.assertIn('Обработано событий: 20', out)
+        self.assertEqual(notified, 20 * readers)
+        self.assertEqual(pending, 0)
+        # каждое событие забрал ровно один поток
+        self.assertEqual(attempts, [1])
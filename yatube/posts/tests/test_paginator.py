@@ -1,5 +1,10 @@
+from unittest import mock
+
+from django.core.cache import cache
 from django.urls import reverse
+from posts import utils
 from posts.models import Post, Group, User
+from posts.utils import WindowedPaginator
 from django.test import TestCase, Client
 
 
@@ -27,6 +32,11 @@ class PaginatorViewsTest(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
+    def get_second_page(self, url):
+        response = self.authorized_client.get(url)
+        cursor = response.context['page_obj'].paginator.next_cursor
+        return self.authorized_client.get(url, {'cursor': cursor})
+
     def test_index_first_page_contains_ten_records(self):
         """Проверка, паджинатор выводит 10 записей на страницу index"""
         response = self.authorized_client.get(reverse('posts:index'))
@@ -34,9 +44,7 @@ class PaginatorViewsTest(TestCase):
 
     def test_index_second_page_contains_two_records(self):
         """Проверка, паджинатор выводит 4 записи на 2ю страницу index"""
-        response = self.authorized_client.get(
-            (reverse('posts:index') + '?page=2')
-        )
+        response = self.get_second_page(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), 3)
 
     def test_group_list_first_page_contains_ten_records(self):
@@ -48,9 +56,8 @@ class PaginatorViewsTest(TestCase):
 
     def test_group_list_second_page_contains_two_records(self):
         """Проверка, паджинатор выводит 4 записи на 2ю страницу group_list"""
-        response = self.authorized_client.get(
-            (reverse('posts:group_list', kwargs={'slug': 'test-slug'}))
-            + '?page=2'
+        response = self.get_second_page(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
         )
         self.assertEqual(len(response.context['page_obj']), 3)
 
@@ -63,10 +70,114 @@ class PaginatorViewsTest(TestCase):
 
     def test_profile_second_page_contains_two_records(self):
         """Проверка, паджинатор выводит 4 записи на 2ю страницу profile"""
-        response = self.authorized_client.get(
-            (
-                reverse('posts:profile', kwargs={'username': 'Artyom'})
-                + '?page=2'
-            )
+        response = self.get_second_page(
+            reverse('posts:profile', kwargs={'username': 'Artyom'})
         )
         self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_pages_do_not_overlap(self):
+        """Курсор следующей и предыдущей страниц не теряет и не
+        дублирует записи"""
+        url = reverse('posts:index')
+        first = self.authorized_client.get(url).context['page_obj']
+        first_page = list(first)
+        self.assertIsNone(first.paginator.previous_cursor)
+        second = self.authorized_client.get(
+            url, {'cursor': first.paginator.next_cursor}
+        ).context['page_obj']
+        self.assertIsNone(second.paginator.next_cursor)
+        self.assertEqual(
+            set(first_page) | set(second), set(Post.objects.all()))
+        self.assertFalse(set(first_page) & set(second))
+        back = self.authorized_client.get(
+            url, {'cursor': second.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), first_page)
+
+    def test_cursor_page_navigation_without_count(self):
+        """has_next и has_previous отвечают по курсорам, без COUNT(*)"""
+        url = reverse('posts:index')
+        first = self.authorized_client.get(url).context['page_obj']
+        with self.assertNumQueries(0):
+            self.assertTrue(first.has_next())
+            self.assertFalse(first.has_previous())
+        second = self.authorized_client.get(
+            url, {'cursor': first.paginator.next_cursor}
+        ).context['page_obj']
+        with self.assertNumQueries(0):
+            self.assertFalse(second.has_next())
+            self.assertTrue(second.has_previous())
+        with self.assertRaises(TypeError):
+            second.paginator.count
+
+    def test_cursor_links_keep_query(self):
+        """Ссылки на соседние страницы сохраняют остальные параметры"""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'order': 'old'})
+        cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, f'?order=old&amp;cursor={cursor}')
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+@mock.patch.object(utils, 'EXACT_COUNT_LIMIT', 5)
+class WindowedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = User.objects.create_user(username='windowed')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=user) for i in range(23))
+
+    def setUp(self):
+        cache.clear()
+        self.posts = Post.objects.order_by('-id')
+
+    def first(self, number):
+        ids = self.posts.values_list('id', flat=True)[:number]
+        return self.posts.filter(pk__in=list(ids))
+
+    def test_small_result_counted_exactly(self):
+        """Выборка не больше порога считается точно"""
+        paginator = WindowedPaginator(self.first(4), 2)
+        self.assertTrue(paginator.count_is_exact)
+        self.assertEqual(paginator.count, 4)
+
+    def test_large_result_counted_in_background(self):
+        """Без кэша число строк — оценка, точное считается фоном в кэш"""
+        with self.settings(BACKGROUND_TASKS_ASYNC=False):
+            paginator = WindowedPaginator(self.posts, 2)
+            self.assertFalse(paginator.count_is_exact)
+            self.assertEqual(paginator.count, 23)
+        key = utils.count_cache_key(self.posts.order_by())
+        self.assertEqual(cache.get(key), 23)
+        with self.assertNumQueries(1):
+            self.assertEqual(WindowedPaginator(self.posts, 2).count, 23)
+
+    def test_estimate_is_corrected_by_pages(self):
+        """Страницы за оценкой открываются и уточняют число строк"""
+        key = utils.count_cache_key(self.posts.order_by())
+        cache.set(key, 6)
+        paginator = WindowedPaginator(self.posts, 2)
+        page = paginator.get_page(5)
+        self.assertEqual(len(page), 2)
+        self.assertTrue(page.has_next())
+        last = WindowedPaginator(self.posts, 2).get_page(12)
+        self.assertEqual(len(last), 1)
+        self.assertFalse(last.has_next())
+        self.assertEqual(last.paginator.count, 23)
+        self.assertEqual(
+            WindowedPaginator(self.posts, 2).get_page(40).number, 1)
+
+    def test_window_around_current_page(self):
+        """Ссылки выводятся только на соседние страницы"""
+        paginator = WindowedPaginator(self.first(5), 1)
+        paginator.get_page(3)
+        self.assertEqual(list(paginator.page_window), [1, 2, 3, 4, 5])
+        paginator = WindowedPaginator(self.posts, 2, window=1)
+        paginator.get_page(7)
+        self.assertEqual(list(paginator.page_window), [6, 7, 8])
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.explain import explain_feeds
+from posts.explain import problems as explain_problems
+from posts.models import Comment, Follow, Group, Post, User
+
+from .utils import QueryBudgetMixin
+
+AUTHORS_COUNT = 12
+FEED_QUERY_BUDGET = 6
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for i in range(AUTHORS_COUNT):
+            author = User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name=f'{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {i}')
+            Comment.objects.create(post=post, author=author, text='К')
+        cls.post = post
+        for i in range(AUTHORS_COUNT):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.get(username=f'author{i}'),
+                text=f'Комментарий {i}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_views_fit_query_budget(self):
+        """Ленты и страница поста не делают запросов на каждый объект"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author0'}),
+            reverse('posts:follow_index'),
+            reverse('posts:trending'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.client, url, FEED_QUERY_BUDGET)
+
+    def test_feed_cards_have_authors_and_groups(self):
+        """Проекция полей не теряет данных, которые выводят карточки"""
+        response = self.assertQueryBudget(
+            self.client, reverse('posts:index'), FEED_QUERY_BUDGET)
+        self.assertContains(response, 'Имя 11')
+        self.assertContains(
+            response, reverse('posts:group_list', kwargs={'slug': 'group'}))
+
+    def test_feed_queries_use_indexes(self):
+        """EXPLAIN запросов лент не находит полных просмотров и сортировок"""
+        for name, plan, problems in explain_feeds():
+            with self.subTest(query=name):
+                self.assertEqual(problems, [], plan)
+
+    def test_explain_flags_full_scans(self):
+        plan = ('2 0 0 SCAN posts_post\n'
+                '5 0 0 SCAN posts_comment USING INDEX comment_post_idx\n'
+                '9 0 0 USE TEMP B-TREE FOR ORDER BY')
+        self.assertEqual(
+            explain_problems(plan, 'sqlite'),
+            ['полный просмотр posts_post', 'сортировка без индекса'])
+        self.assertEqual(
+            explain_problems('Seq Scan on posts_post  (cost=0.00..1.01)',
+                             'postgresql'),
+            ['полный просмотр posts_post'])
@@ -0,0 +1,97 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import (Comment, Follow, FollowChange, Post,
+                          Recommendation, RecommendationRun, User)
+from posts import recommendations
+from posts.recommendations import Matrices, recommend
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.writer, cls.critic, cls.silent = (
+            User.objects.create_user(username=name) for name in (
+                'reader', 'friend', 'writer', 'critic', 'silent'))
+        for author in (cls.friend, cls.writer, cls.critic):
+            Post.objects.create(author=author, text=f'Пост {author}')
+        cls.post = Post.objects.get(author=cls.friend)
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.writer)
+        for user in (cls.reader, cls.critic, cls.silent):
+            Comment.objects.create(post=cls.post, author=user, text='К')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def recommended(self, user):
+        return list(Recommendation.objects.filter(
+            user=user).values_list('author__username', flat=True))
+
+    def test_friends_of_friends_and_commenters(self):
+        """Рекомендуются авторы из подписок друзей и соседи по
+        обсуждениям, но не те, на кого уже подписан, и не читатели"""
+        scores = Matrices().scores(self.reader.pk)
+        self.assertEqual(scores[self.writer.pk], 1.0)
+        self.assertAlmostEqual(scores[self.critic.pk], 2.0)
+        recommend(full=True)
+        self.assertEqual(
+            self.recommended(self.reader), ['critic', 'writer'])
+
+    @mock.patch.object(recommendations, 'SYNC_WINDOW', 0)
+    def test_rerun_recomputes_only_changed_users(self):
+        """Повторный прогон пересчитывает только затронутых"""
+        self.assertEqual(recommend(), (User.objects.count(), True))
+        self.assertEqual(recommend(), (0, False))
+        # подписка writer меняет «друзей друзей» его подписчика friend
+        Follow.objects.create(user=self.writer, author=self.critic)
+        total, full = recommend()
+        self.assertFalse(full)
+        self.assertEqual(total, 2)
+        self.assertEqual(self.recommended(self.friend), ['critic'])
+        self.assertEqual(RecommendationRun.objects.count(), 3)
+
+    def test_rerun_sees_late_commits(self):
+        """Изменение с id меньше границы прошлого прогона, зафиксированное
+        после него, тоже пересчитывается"""
+        recommend()
+        Follow.objects.create(user=self.writer, author=self.critic)
+        # граница прошлого прогона уже покрывает id этой записи
+        RecommendationRun.objects.update(
+            follow_change_id=FollowChange.objects.latest('pk').pk)
+        total, full = recommend()
+        self.assertFalse(full)
+        self.assertEqual(self.recommended(self.friend), ['critic'])
+
+    def test_dense_rows_are_capped(self):
+        """Из подписок пользователя берутся только MAX_FANOUT самых
+        разреженных"""
+        Follow.objects.create(user=self.reader, author=self.writer)
+        Follow.objects.create(user=self.writer, author=self.critic)
+        with mock.patch.object(recommendations, 'MAX_FANOUT', 1):
+            scores = Matrices().scores(self.reader.pk)
+        self.assertEqual(dict(scores), {self.writer.pk: 1.0})
+
+    def test_pages_show_recommendations_in_one_query(self):
+        """Профиль и лента подписок показывают блок «Кого почитать»,
+        уже прочитанные авторы в нём не показываются"""
+        call_command('recommend_authors', '--full', stdout=StringIO())
+        for url in (reverse('posts:follow_index'), reverse(
+                'posts:profile', kwargs={'username': 'friend'})):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    [author.username for author in
+                     response.context['recommended_authors']],
+                    ['critic', 'writer'])
+                self.assertContains(response, 'Кого почитать')
+        Follow.objects.create(user=self.reader, author=self.critic)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [author.username for author in
+             response.context['recommended_authors']], ['writer'])
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.db import connections
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core.db.routers import ReplicaRouter, read_from_replica
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # реплика в тестах — второе соединение к той же базе в памяти;
+        # без read_uncommitted оно упиралось бы в блокировки незакрытой
+        # транзакции теста
+        with connections['replica'].cursor() as cursor:
+            cursor.execute('PRAGMA read_uncommitted = 1')
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = getattr(self.client, method)(url, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_feeds_read_from_replica(self):
+        """Ленты и страница поста читают посты с реплики"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response, _, replica = self.queries('get', url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(replica, 0)
+
+    def test_writes_go_to_primary(self):
+        """Запись идёт в default, после неё клиент читает только default"""
+        response, primary, replica = self.queries(
+            'post', reverse('posts:add_comment',
+                            kwargs={'post_id': self.post.id}),
+            data={'text': 'Комментарий'})
+        self.assertEqual(replica, 0)
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        response, primary, replica = self.queries(
+            'get', reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.id}))
+        self.assertContains(response, 'Комментарий')
+        self.assertEqual(replica, 0)
+
+    def test_form_display_does_not_stick(self):
+        """Показ формы без записи не привязывает клиента к default"""
+        response = self.client.get(reverse('posts:post_create'))
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_without_replicas_reads_primary(self):
+        """Без настроенных реплик всё читается из default"""
+        with self.settings(DATABASE_REPLICAS=[]):
+            _, primary, replica = self.queries('get', reverse('posts:index'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_request_reads_one_replica(self):
+        """Все чтения одного запроса идут в одну и ту же реплику"""
+        router = ReplicaRouter()
+
+        @read_from_replica
+        def view(request):
+            return {router.db_for_read(Post) for _ in range(20)}
+
+        with self.settings(DATABASE_REPLICAS=['replica_1', 'replica_2']):
+            chosen = view(RequestFactory().get('/'))
+        self.assertEqual(len(chosen), 1)
+        self.assertEqual(router.db_for_read(Post), 'default')
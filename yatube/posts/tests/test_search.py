@@ -0,0 +1,69 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Post, SearchToken, User
+from posts.search import stem, tokenize
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы русского слова приводятся к одной основе"""
+        forms = {
+            'книга': ('книги', 'книгами', 'книгу'),
+            'писатель': ('писатели', 'писателей', 'писателю'),
+            'красивый': ('красивая', 'красивое', 'красивыми'),
+        }
+        for word, word_forms in forms.items():
+            for form in word_forms:
+                with self.subTest(form=form):
+                    self.assertEqual(stem(form), stem(word))
+
+    def test_tokenize_skips_short_words_and_keeps_latin(self):
+        self.assertEqual(tokenize('Я читаю Django'), ['чита', 'django'])
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.war = Post.objects.create(
+            author=cls.user, text='Война и мир. Война глазами Толстого.')
+        cls.peace = Post.objects.create(
+            author=cls.user, text='Мирная жизнь в деревне')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Рецепт пирога с яблоками')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'].object_list)
+
+    def test_search_finds_word_forms_ranked(self):
+        """Поиск находит посты по другим формам слов и ранжирует их"""
+        self.assertEqual(self.search('войны'), [self.war])
+        self.assertEqual(self.search('мир война'), [self.war])
+        self.assertEqual(self.search('яблоко'), [self.other])
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при редактировании и удалении поста"""
+        self.peace.text = 'Теперь здесь про яблоки'
+        self.peace.save()
+        self.assertEqual(set(self.search('яблоки')), {self.peace, self.other})
+        Post.objects.filter(pk=self.other.pk).delete()
+        self.assertEqual(self.search('яблоки'), [self.peace])
+
+    def test_empty_query_returns_nothing(self):
+        self.assertEqual(self.search('  '), [])
+
+    def test_rebuild_search_index_command(self):
+        """Команда rebuild_search_index восстанавливает индекс"""
+        SearchToken.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('деревня'), [self.peace])
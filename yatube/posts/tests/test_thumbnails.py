@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts.models import Post, User
+from posts.thumbnails import thumbnail, thumbnail_name
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='photo.jpg', size=(1000, 500), color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_ASYNC=False)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def create_post(self):
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой', 'image': make_image()})
+        return Post.objects.get(text='Пост с картинкой')
+
+    def test_thumbnails_generated_on_create(self):
+        """После создания поста миниатюры готовы, а размеры сохранены"""
+        post = self.create_post()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertEqual((post.image_width, post.image_height), (1000, 500))
+        self.assertEqual(thumbnail(post, 'feed')[2:], (700, 350))
+        for size in ('small', 'feed', 'large'):
+            with self.subTest(size=size):
+                self.assertTrue(default_storage.exists(
+                    thumbnail_name(post.image.name, size, 'jpg')))
+
+    def test_feed_renders_prepared_thumbnail(self):
+        """Лента ссылается на готовую миниатюру с размерами"""
+        post = self.create_post()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail(post, 'feed').url)
+        self.assertContains(response, 'width="700" height="350"')
+
+    def test_new_image_regenerates_thumbnails(self):
+        """Замена картинки при редактировании строит новые миниатюры"""
+        post = self.create_post()
+        old_url = thumbnail(post, 'feed').url
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': post.text,
+                  'image': make_image('other.jpg', (300, 600), 'blue')})
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertEqual((post.image_width, post.image_height), (300, 600))
+        self.assertNotEqual(thumbnail(post, 'feed').url, old_url)
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from django.utils import timezone
+from posts.models import (Comment, FeedItem, Follow, Group, Post, SearchToken,
+                          User, UserCounters)
+
+
+class TransferCommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', password='secret')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Старый пост о кошках', author=cls.author, group=cls.group)
+        cls.pub_date = timezone.now() - timedelta(days=30)
+        Post.objects.filter(pk=cls.post.pk).update(pub_date=cls.pub_date)
+        Post.objects.create(text='Пост без группы', author=cls.author)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def export(self, name, **options):
+        path = os.path.join(self.directory, name)
+        call_command('export_posts', output=path, stderr=StringIO(),
+                     **options)
+        return path
+
+    def wipe(self):
+        for model in (Comment, Follow, Post, Group, User):
+            model.objects.all().delete()
+
+    def test_ndjson_round_trip(self):
+        """Выгрузка и загрузка сохраняют данные и пересобирают ленты"""
+        path = self.export('dump.ndjson', chunk_size=1)
+        with open(path, encoding='utf-8') as dump:
+            first = json.loads(dump.readline())
+        self.assertEqual(first['model'], 'user')
+        self.wipe()
+        out = StringIO()
+        call_command('import_posts', path, batch_size=1, stdout=out)
+        self.assertIn('post 2', out.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.comments_count, 1)
+        self.assertTrue(User.objects.get(username='author').check_password(
+            'secret'))
+        self.assertEqual(
+            UserCounters.objects.get(user__username='author').posts_count, 2)
+        self.assertEqual(FeedItem.objects.filter(user=self.reader).count(), 2)
+        self.assertTrue(SearchToken.objects.filter(post=post).exists())
+
+    def test_rebuild_touches_only_imported_rows(self):
+        """Загрузка поверх данных пересобирает только загруженное"""
+        other = Post.objects.create(text='Чужой пост', author=self.reader)
+        SearchToken.objects.filter(post=other).delete()
+        pub_date = timezone.now() - timedelta(days=3)
+        path = os.path.join(self.directory, 'new.ndjson')
+        with open(path, 'w', encoding='utf-8') as dump:
+            dump.write(json.dumps({
+                'model': 'post', 'id': 500, 'text': 'Загруженный пост',
+                'pub_date': pub_date.isoformat(),
+                'author_id': self.author.pk, 'group_id': None, 'image': '',
+            }) + '\n')
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(Post.objects.get(pk=500).pub_date, pub_date)
+        self.assertTrue(SearchToken.objects.filter(post_id=500).exists())
+        self.assertFalse(SearchToken.objects.filter(post=other).exists())
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count, 3)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, post_id=500).exists())
+        self.assertTrue(
+            Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_csv_single_model(self):
+        path = self.export('groups.csv', models='group')
+        with open(path, encoding='utf-8') as dump:
+            self.assertEqual(dump.readline().strip(),
+                             'id,title,slug,description')
+        Group.objects.all().delete()
+        call_command('import_posts', path, model='group', stdout=StringIO())
+        self.assertEqual(Group.objects.get().slug, 'group')
+
+    def test_broken_reference_rolls_back(self):
+        """Ссылка на несуществующего автора отменяет всю загрузку"""
+        path = os.path.join(self.directory, 'broken.ndjson')
+        with open(path, 'w', encoding='utf-8') as dump:
+            dump.write(json.dumps({
+                'model': 'post', 'id': 999, 'text': 'Сирота',
+                'pub_date': timezone.now().isoformat(),
+                'author_id': 12345, 'group_id': None, 'image': '',
+            }) + '\n')
+        with self.assertRaises(IntegrityError):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(Post.objects.filter(pk=999).exists())
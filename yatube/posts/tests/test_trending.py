@@ -0,0 +1,87 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from posts import trending
+from posts.models import (Comment, Follow, Post, TrendingEpoch, TrendingScore,
+                          User)
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.popular = User.objects.create_user(username='popular')
+        for number in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'reader{number}'),
+                author=cls.popular)
+        cls.quiet = Post.objects.create(author=cls.author, text='Тихий пост')
+        cls.discussed = Post.objects.create(
+            author=cls.author, text='Обсуждаемый пост')
+        cls.reach = Post.objects.create(
+            author=cls.popular, text='Пост с охватом')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def ids(self):
+        response = self.client.get(reverse('posts:trending'))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_comments_and_reach_raise_posts(self):
+        """Комментарии и охват автора поднимают пост в популярных"""
+        self.assertEqual(self.ids()[0], self.reach.pk)
+        for number in range(2):
+            self.client.post(
+                reverse('posts:add_comment',
+                        kwargs={'post_id': self.discussed.pk}),
+                data={'text': f'Комментарий {number}'})
+        self.assertEqual(
+            self.ids(), [self.discussed.pk, self.reach.pk, self.quiet.pk])
+
+    def test_fresh_events_outweigh_old(self):
+        """Старый комментарий весит меньше свежего"""
+        comment = Comment.objects.create(
+            post=self.quiet, author=self.author, text='Старый')
+        Comment.objects.filter(pk=comment.pk).update(
+            created=timezone.now() - 2 * trending.HALF_LIFE)
+        comment.refresh_from_db()
+        TrendingScore.objects.update(score=0)
+        trending.add_comment(comment)
+        Comment.objects.create(
+            post=self.discussed, author=self.author, text='Свежий')
+        quiet, discussed = (
+            TrendingScore.objects.get(post=post).score
+            for post in (self.quiet, self.discussed))
+        self.assertAlmostEqual(quiet * 4, discussed, places=3)
+
+    def test_renormalize_keeps_order_and_drops_cold(self):
+        """Перенормировка сохраняет порядок и убирает остывшие посты"""
+        before = self.ids()
+        call_command('renormalize_trending', stdout=StringIO())
+        self.assertEqual(self.ids(), before)
+        call_command('renormalize_trending', '--rebuild', stdout=StringIO())
+        self.assertEqual(self.ids(), before)
+        trending.renormalize(timezone.now() + timedelta(days=30))
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_event_long_after_epoch_renormalizes(self):
+        """Событие спустя годы после начала отсчёта переносит его, а не
+        переполняет exp()"""
+        TrendingEpoch.objects.update(
+            started=timezone.now() - timedelta(days=600))
+        Comment.objects.create(
+            post=self.quiet, author=self.author, text='Спустя годы')
+        started = TrendingEpoch.objects.get().started
+        self.assertLess(timezone.now() - started, timedelta(minutes=1))
+        self.assertEqual(
+            list(TrendingScore.objects.values_list('post', flat=True)),
+            [self.quiet.pk])
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+EXIF_DESCRIPTION_TAG = 0x010e
+
+
+def make_upload(name, size=(100, 100), image_format='JPEG', **options):
+    buffer = BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(
+        buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_ASYNC=False)
+class BoundedUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(
+            os.path.join(TEMP_MEDIA_ROOT, 'posts'), ignore_errors=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, image):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой', 'image': image})
+
+    def stored_files(self):
+        return [
+            name
+            for _, _, files in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+            for name in files
+        ]
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_upload_over_byte_limit_is_rejected(self):
+        """Файл больше лимита отклоняется с ошибкой формы"""
+        response = self.create_post(make_upload('big.jpg'))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_rejected_upload_stops_reading_request(self):
+        """После отказа остаток тела запроса не читается"""
+        response = self.client.post(reverse('posts:post_create'), data={
+            'image': make_upload('big.jpg'), 'text': 'После картинки'})
+        self.assertEqual(response.context['form']['text'].value(), None)
+        self.assertIn('image', response.context['form'].errors)
+        self.assertEqual(self.stored_files(), [])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=50 * 50)
+    def test_upload_over_pixel_limit_is_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку"""
+        response = self.create_post(make_upload('wide.png', (60, 60), 'PNG'))
+        self.assertIn('пикселей', response.context['form'].errors['image'][0])
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_upload_is_reencoded_without_exif(self):
+        """Принятая картинка пересохраняется в JPEG без EXIF"""
+        exif = Image.Exif()
+        exif[EXIF_DESCRIPTION_TAG] = 'Координаты автора'
+        self.create_post(make_upload('photo.jpg', exif=exif.tobytes()))
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertTrue(post.thumbnails_ready)
+        with default_storage.open(post.image.name) as stored:
+            image = Image.open(stored)
+            self.assertNotIn('exif', image.info)
+        self.assertEqual(
+            self.stored_files(), [os.path.basename(post.image.name)])
@@ -1,9 +1,11 @@
 import shutil
 import tempfile
+from io import StringIO
 from django.conf import settings
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
-from posts.models import Post, Group, User, Comment, Follow
+from posts.models import Post, Group, User, Comment, FeedItem, Follow
+from django.core.management import call_command
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
@@ -309,6 +311,63 @@ class CacheViewsTests(TestCase):
         changed_state_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(initial_state.content, changed_state_2.content)
 
+    def test_post_edit_invalidates_only_its_card(self):
+        """Редактирование через post_edit обновляет только карточку
+        изменённого поста"""
+        author_client = Client()
+        author_client.force_login(self.post.author)
+        other = Post.objects.create(author=self.user, text='Другой пост')
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=other.pk).update(text='Тихая правка')
+        author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Отредактированная запись'})
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отредактированная запись')
+        self.assertContains(response, 'Другой пост')
+        self.assertNotContains(response, 'Тихая правка')
+
+    def test_new_comment_invalidates_card(self):
+        """Новый комментарий обновляет счётчик на карточке поста"""
+        self.guest_client.get(reverse('posts:index'))
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Комментарий'})
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_comment_delete_invalidates_card(self):
+        """Удалённый комментарий убирается из счётчика на карточке"""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        self.assertContains(
+            self.guest_client.get(reverse('posts:index')), 'Комментариев: 1')
+        comment.delete()
+        self.assertContains(
+            self.guest_client.get(reverse('posts:index')), 'Комментариев: 0')
+
+    def test_group_rename_invalidates_cards(self):
+        """Смена адреса группы обновляет ссылки на карточках её постов"""
+        group = Group.objects.create(
+            title='Группа', slug='old-slug', description='Описание')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        self.guest_client.get(reverse('posts:index'))
+        group.slug = 'new-slug'
+        group.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(
+            response, reverse('posts:group_list', args=['new-slug']))
+
+    def test_author_rename_invalidates_cards(self):
+        """Смена имени автора обновляет его карточки во всех лентах"""
+        self.guest_client.get(reverse('posts:index'))
+        author = self.post.author
+        author.first_name = 'Лев'
+        author.last_name = 'Толстой'
+        author.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Лев Толстой')
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -366,3 +425,32 @@ class FollowTests(TestCase):
             reverse('posts:follow_index'))
         obj = response.context['page_obj'].object_list
         self.assertNotIn(post, obj)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора сразу попадает в материализованную ленту
+        подписчика, а отписка убирает посты автора из ленты"""
+        self.client_user_follower.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author_following.username}))
+        new_post = Post.objects.create(
+            author=self.author_following, text='Свежий пост')
+        self.assertEqual(
+            set(FeedItem.objects.filter(
+                user=self.user_follower).values_list('post', flat=True)),
+            {self.post.id, new_post.id})
+        self.client_user_follower.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author_following.username}))
+        self.assertFalse(
+            FeedItem.objects.filter(user=self.user_follower).exists())
+
+    def test_rebuild_feeds_command(self):
+        """Команда rebuild_feeds восстанавливает ленту по подпискам"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.author_following)
+        FeedItem.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        response = self.client_user_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj'].object_list), [self.post])
@@ -0,0 +1,126 @@
+"""Заранее подготовленные миниатюры картинок постов.
+
+Миниатюры всех размеров строятся в фоновом пуле (см. posts.images) после
+сохранения поста, а размеры исходной картинки пишутся в строку Post.
+Шаблону остаётся собрать URL по имени файла, не открывая картинку и не
+обращаясь к хранилищу ключей, как это делал sorl-thumbnail.
+
+Имя миниатюры выводится из имени картинки, а оно — из хеша содержимого
+(core.storage), так что одинаковые картинки разных постов делят один
+набор миниатюр и строятся один раз.
+"""
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, features
+
+from core.http_cache import purge
+
+from .cards import invalidate_post_card
+from .models import Post
+
+THUMBNAIL_SIZES = {
+    'small': (400, 175),
+    'feed': (800, 350),
+    'large': (1600, 700),
+}
+THUMBNAIL_DIR = 'thumbs'
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+Thumbnail = namedtuple('Thumbnail', 'url webp_url width height')
+
+
+def webp_supported():
+    return features.check('webp')
+
+
+def fit(width, height, size):
+    """Размеры картинки, вписанной в size без увеличения."""
+    box_width, box_height = THUMBNAIL_SIZES[size]
+    scale = min(box_width / width, box_height / height, 1)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def thumbnail_name(image_name, size, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{THUMBNAIL_DIR}/{stem[:2]}/{stem}_{size}.{extension}'
+
+
+def thumbnail_names(image_name):
+    """Имена всех возможных миниатюр картинки."""
+    return [
+        thumbnail_name(image_name, size, extension)
+        for size in THUMBNAIL_SIZES for extension in ('jpg', 'webp')
+    ]
+
+
+def thumbnail(post, size):
+    """Описание готовой миниатюры или None, если её ещё нет."""
+    if not (post.image and post.thumbnails_ready):
+        return None
+    width, height = fit(post.image_width, post.image_height, size)
+    webp_url = None
+    if post.thumbnails_webp:
+        webp_url = default_storage.url(
+            thumbnail_name(post.image.name, size, 'webp'))
+    return Thumbnail(
+        default_storage.url(thumbnail_name(post.image.name, size, 'jpg')),
+        webp_url, width, height)
+
+
+def _save(name, image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def _build(image_name, original, webp):
+    rgb = original.convert('RGB')
+    for size in THUMBNAIL_SIZES:
+        resized = rgb.resize(
+            fit(original.width, original.height, size), Image.LANCZOS)
+        _save(thumbnail_name(image_name, size, 'jpg'), resized, 'JPEG',
+              quality=JPEG_QUALITY, optimize=True, progressive=True)
+        if webp:
+            _save(thumbnail_name(image_name, size, 'webp'), resized, 'WEBP',
+                  quality=WEBP_QUALITY)
+
+
+def _thumbnails_exist(image_name, webp):
+    extensions = ('jpg', 'webp') if webp else ('jpg',)
+    return all(
+        default_storage.exists(thumbnail_name(image_name, size, extension))
+        for size in THUMBNAIL_SIZES for extension in extensions
+    )
+
+
+def generate_thumbnails(post_id, force=False):
+    """Строит миниатюры всех размеров и отмечает пост готовым.
+
+    Если миниатюры этой картинки уже построены для другого поста, читает
+    только заголовок картинки; force перестраивает их заново.
+    """
+    post = Post.objects.only('image').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    webp = webp_supported()
+    with post.image.storage.open(post.image.name) as source:
+        original = Image.open(source)
+        if force or not _thumbnails_exist(post.image.name, webp):
+            original.load()
+            _build(post.image.name, original, webp)
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        image_width=original.width,
+        image_height=original.height,
+        thumbnails_ready=True,
+        thumbnails_webp=webp,
+    )
+    if updated:
+        invalidate_post_card(post_id)
+        purge(f'post-{post_id}')
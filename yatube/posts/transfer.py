@@ -0,0 +1,283 @@
+"""Потоковые выгрузка и загрузка данных в NDJSON и CSV.
+
+В отличие от dumpdata/loaddata ни одна сторона не держит данные в памяти
+целиком: выгрузка читает таблицы через values_list().iterator(), загрузка
+копит не больше batch_size объектов и пишет их многострочными INSERT.
+Загрузка, как и loaddata, идёт в одной транзакции с отложенной проверкой
+внешних ключей, которые проверяются один раз в конце, и так же пишет
+строки как есть (raw): даты из выгрузки не перетираются auto_now_add.
+
+Сигналы при загрузке не посылаются, поэтому после неё ленты, счётчики,
+поисковый индекс, ссылки на картинки и популярность пересобираются для
+загруженных диапазонов id, а если подписки загружались, графы подписок в
+памяти процессов получают отметку сброса.
+"""
+import csv
+import json
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import AutoField, Q
+from django.utils import timezone
+
+from . import counters, feeds, graph, media, search, trending
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('ndjson', 'csv')
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 2000
+
+# Модели в порядке зависимостей и выгружаемые поля (attname для FK)
+TRANSFER_MODELS = {
+    'user': (User, (
+        'id', 'username', 'password', 'first_name', 'last_name', 'email',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    )),
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+    )),
+    'follow': (Follow, ('id', 'user_id', 'author_id')),
+    'comment': (Comment, (
+        'id', 'text', 'created', 'post_id', 'author_id', 'parent_id', 'path',
+    )),
+}
+
+
+def _dump(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_rows(model_names, stream, output_format='ndjson',
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """Пишет строки моделей в stream; возвращает число строк по моделям.
+
+    В NDJSON каждая строка несёт поле model, поэтому в один поток можно
+    выгрузить все модели. CSV выгружает ровно одну модель.
+    """
+    if output_format == 'csv' and len(model_names) != 1:
+        raise ValueError('CSV выгружает ровно одну модель')
+    totals = {}
+    for name in model_names:
+        model, fields = TRANSFER_MODELS[name]
+        rows = model.objects.order_by('pk').values_list(*fields).iterator(
+            chunk_size=chunk_size)
+        total = 0
+        if output_format == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(
+                    '' if value is None else _dump(value) for value in row)
+                total += 1
+        else:
+            for row in rows:
+                record = {'model': name}
+                record.update(zip(fields, map(_dump, row)))
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                total += 1
+        totals[name] = total
+    return totals
+
+
+def _read(stream, input_format, model_name):
+    """Пары (имя модели, словарь полей) из потока."""
+    if input_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield model_name, row
+        return
+    for line in stream:
+        if line.strip():
+            record = json.loads(line)
+            yield record.pop('model', model_name), record
+
+
+def _converters(model, fields):
+    """Для каждого поля: attname, допускает ли NULL, приведение строки и
+    заполняется ли оно текущим временем, если в выгрузке его нет.
+
+    Поля, значения которых и так хранятся строками, не приводятся вовсе —
+    на миллионах строк это заметная часть времени загрузки.
+    """
+    converters = []
+    for attname in fields:
+        field = model._meta.get_field(attname)
+        target = field.target_field if field.is_relation else field
+        convert = target.to_python
+        if target.get_internal_type() in ('CharField', 'TextField',
+                                          'SlugField', 'FileField',
+                                          'ImageField', 'EmailField'):
+            convert = None
+        converters.append((
+            attname, field.null, convert,
+            getattr(field, 'auto_now_add', False)))
+    return converters
+
+
+def _build(model, converters, record):
+    values = {}
+    for attname, null, convert, auto_now_add in converters:
+        if attname not in record:
+            # строки пишутся без pre_save, поэтому дату, которой нет в
+            # выгрузке, объект получает сам, как при обычном сохранении
+            if auto_now_add:
+                values[attname] = timezone.now()
+            continue
+        value = record[attname]
+        if value == '' and null:
+            value = None
+        elif isinstance(value, str) and convert is not None:
+            value = convert(value)
+        values[attname] = value
+    return model(**values)
+
+
+def _insert(model, objs, ignore_conflicts):
+    """Пишет объекты как есть, без pre_save, пачками под лимиты бэкенда.
+
+    bulk_create вызывает pre_save, и auto_now_add заменил бы даты из
+    выгрузки текущим временем.
+    """
+    fields = model._meta.concrete_fields
+    groups = (
+        ([obj for obj in objs if obj.pk is not None], fields),
+        ([obj for obj in objs if obj.pk is None], [
+            field for field in fields if not isinstance(field, AutoField)]),
+    )
+    for rows, row_fields in groups:
+        # размер одного INSERT бэкенд выбирает сам под свои лимиты
+        # параметров (у SQLite это 999 переменных)
+        size = max(connection.ops.bulk_batch_size(row_fields, rows), 1)
+        for start in range(0, len(rows), size):
+            model._base_manager._insert(
+                rows[start:start + size], fields=row_fields, raw=True,
+                ignore_conflicts=ignore_conflicts)
+
+
+def _check_and_reset(models):
+    """Проверяет отложенные внешние ключи и сдвигает последовательности id."""
+    connection.check_constraints(
+        table_names=[model._meta.db_table for model in models])
+    # явные id не двигают последовательности PostgreSQL
+    sequences = connection.ops.sequence_reset_sql(no_style(), models)
+    if sequences:
+        with connection.cursor() as cursor:
+            for sql in sequences:
+                cursor.execute(sql)
+
+
+def _track(imported, name, pk):
+    """Расширяет диапазон id модели; без id диапазона больше нет."""
+    if name in imported and imported[name] is None:
+        return
+    if pk is None:
+        imported[name] = None
+        return
+    low, high = imported.get(name, (pk, pk))
+    imported[name] = (min(low, pk), max(high, pk))
+
+
+def import_rows(stream, input_format='ndjson', model_name=None,
+                batch_size=DEFAULT_BATCH_SIZE, ignore_conflicts=False,
+                imported=None):
+    """Загружает строки пачками по batch_size; возвращает число по моделям.
+
+    В словарь imported, если он передан, записываются диапазоны (min, max)
+    id загруженных строк по моделям; None — у части строк id не было.
+    """
+    if input_format == 'csv' and model_name not in TRANSFER_MODELS:
+        raise ValueError('Для CSV укажите модель')
+    if imported is None:
+        imported = {}
+    totals = dict.fromkeys(TRANSFER_MODELS, 0)
+    batches = {name: [] for name in TRANSFER_MODELS}
+    converters = {
+        name: _converters(model, fields)
+        for name, (model, fields) in TRANSFER_MODELS.items()
+    }
+
+    def flush(name):
+        if not batches[name]:
+            return
+        _insert(TRANSFER_MODELS[name][0], batches[name], ignore_conflicts)
+        totals[name] += len(batches[name])
+        batches[name] = []
+
+    with transaction.atomic():
+        with connection.constraint_checks_disabled():
+            previous = None
+            for name, record in _read(stream, input_format, model_name):
+                if name not in TRANSFER_MODELS:
+                    raise ValueError(f'Неизвестная модель: {name}')
+                if previous is not None and name != previous:
+                    flush(previous)
+                previous = name
+                obj = _build(
+                    TRANSFER_MODELS[name][0], converters[name], record)
+                _track(imported, name, obj.pk)
+                batches[name].append(obj)
+                if len(batches[name]) >= batch_size:
+                    flush(name)
+            for name in TRANSFER_MODELS:
+                flush(name)
+        _check_and_reset([
+            TRANSFER_MODELS[name][0] for name, total in totals.items()
+            if total])
+    return {name: total for name, total in totals.items() if total}
+
+
+def rebuild_derived(imported=None):
+    """Пересобирает то, что сигналы ведут при обычном сохранении.
+
+    imported — диапазоны id по моделям из import_rows: пересобирается
+    только то, что зависит от строк в них. Без диапазонов или если у части
+    строк не было id, пересборка полная. Строки, пропущенные при
+    ignore_conflicts, попадают в диапазон, и их популярность может
+    прибавиться второй раз; renormalize_trending --rebuild это исправит.
+    """
+    if imported is None or None in imported.values():
+        counters.recount()
+        feeds.rebuild_feeds()
+        search.rebuild_index()
+        media.recount_references()
+        trending.rebuild()
+        graph.reset()
+        return
+
+    def loaded(name):
+        model = TRANSFER_MODELS[name][0]
+        if name not in imported:
+            return model.objects.none()
+        return model.objects.filter(pk__range=imported[name])
+
+    users, posts, follows, comments = (
+        loaded(name) for name in ('user', 'post', 'follow', 'comment'))
+    counters.recount(
+        users=User.objects.filter(
+            Q(pk__in=users.values('pk'))
+            | Q(pk__in=posts.values('author_id'))
+            | Q(pk__in=follows.values('user_id'))
+            | Q(pk__in=follows.values('author_id'))
+        ).values('pk'),
+        posts=Post.objects.filter(
+            Q(pk__in=posts.values('pk'))
+            | Q(pk__in=comments.values('post_id'))
+        ).values('pk'),
+        comments=Comment.objects.filter(
+            Q(pk__in=comments.values('pk'))
+            | Q(pk__in=comments.values('parent_id'))
+        ).values('pk'),
+    )
+    # ленты подписчиков авторов новых постов и тех, кто сам подписался
+    feeds.rebuild_feeds(User.objects.filter(
+        Q(pk__in=follows.values('user_id'))
+        | Q(follower__author__in=posts.values('author_id'))
+    ).values('pk'))
+    search.rebuild_index(posts.values('pk'))
+    media.recount_references(
+        names=posts.exclude(image='').values('image'))
+    trending.add_events(posts, comments)
+    if 'follow' in imported:
+        graph.reset()
@@ -0,0 +1,161 @@
+"""Популярные посты: затухающая популярность, которая ведётся по событиям.
+
+Популярность поста — сумма весов его событий, каждый из которых затухает
+вдвое за HALF_LIFE. Публикация весит POST_WEIGHT плюс охват автора
+(логарифм числа подписчиков), каждый комментарий — COMMENT_WEIGHT, так что
+частые свежие комментарии поднимают пост быстрее, чем старые.
+
+Чтобы не пересчитывать затухание у всех постов, вес события хранится
+умноженным на exp((t - started) / tau), где started — общее для всех строк
+начало отсчёта (TrendingEpoch). Множитель exp(-(now - started) / tau) у
+всех строк одинаков, поэтому сортировка по хранимому score даёт порядок по
+текущей популярности, новое событие — это один UPDATE score = score + w,
+а страница /trending/ читается по индексу (-score, -post) за O(размер
+страницы). Множитель растёт со временем, и команда renormalize_trending
+периодически переносит начало отсчёта на текущий момент, умножая все score
+на exp(-(now - started) / tau) и удаляя остывшие посты. exp() переполняется
+примерно через 510 дней после started, поэтому, если команду долго не
+запускали и показатель дошёл до MAX_GROWTH_EXPONENT, начало отсчёта
+переносит сама запись события.
+
+Событие, записанное одновременно с переносом начала отсчёта, может
+получить вес по старому started; ошибка ограничена одним событием и
+исчезает после следующей пересборки (renormalize_trending --rebuild).
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Comment, Post, TrendingEpoch, TrendingScore, UserCounters
+
+HALF_LIFE = timedelta(hours=12)
+TAU = HALF_LIFE.total_seconds() / math.log(2)
+# Показатель множителя, после которого событие сначала переносит начало
+# отсчёта (около 70 дней при HALF_LIFE в 12 часов)
+MAX_GROWTH_EXPONENT = 100
+POST_WEIGHT = 1.0
+REACH_WEIGHT = 1.0
+COMMENT_WEIGHT = 1.0
+# Посты, остывшие ниже этой популярности, убираются при перенормировке
+MIN_SCORE = 0.01
+# При пересборке события старше этого уже не влияют на популярность
+HORIZON = timedelta(days=7)
+REBUILD_BATCH_SIZE = 1000
+TRENDING_ORDERING = ('-score', '-post_id')
+
+
+def epoch():
+    """Текущее начало отсчёта; при первом обращении — сейчас."""
+    started, _ = TrendingEpoch.objects.get_or_create(
+        pk=1, defaults={'started': timezone.now()})
+    return started.started
+
+
+def _exponent(moment, started):
+    return (moment - started).total_seconds() / TAU
+
+
+def _growth(moment, started):
+    return math.exp(_exponent(moment, started))
+
+
+def post_weight(followers):
+    return POST_WEIGHT + REACH_WEIGHT * math.log1p(followers)
+
+
+def _add(post_id, weight, moment):
+    started = epoch()
+    if _exponent(moment, started) > MAX_GROWTH_EXPONENT:
+        renormalize()
+        started = epoch()
+    score = weight * _growth(moment, started)
+    scores = TrendingScore.objects.filter(post_id=post_id)
+    if scores.update(score=F('score') + score):
+        return
+    try:
+        with transaction.atomic():
+            TrendingScore.objects.create(post_id=post_id, score=score)
+    except IntegrityError:
+        # строку успело создать параллельное событие
+        scores.update(score=F('score') + score)
+
+
+def add_post(post):
+    followers = UserCounters.objects.filter(
+        user_id=post.author_id
+    ).values_list('followers_count', flat=True).first() or 0
+    _add(post.pk, post_weight(followers), post.pub_date)
+
+
+def add_comment(comment):
+    _add(comment.post_id, COMMENT_WEIGHT, comment.created)
+
+
+def renormalize(now=None):
+    """Переносит начало отсчёта на now и удаляет остывшие посты.
+
+    Возвращает пару (число оставшихся постов, число удалённых).
+    """
+    now = now or timezone.now()
+    epoch()
+    with transaction.atomic():
+        # блокировка строки не даёт двум перенормировкам уменьшить score
+        # дважды
+        started = TrendingEpoch.objects.select_for_update().get(pk=1).started
+        factor = math.exp(-_exponent(now, started))
+        TrendingScore.objects.update(score=F('score') * factor)
+        deleted, _ = TrendingScore.objects.filter(
+            score__lt=MIN_SCORE).delete()
+        TrendingEpoch.objects.filter(pk=1).update(started=now)
+        return TrendingScore.objects.count(), deleted
+
+
+def _scores(posts, comments, now):
+    """Популярность постов на момент now по событиям за HORIZON."""
+    since = now - HORIZON
+    scores = defaultdict(float)
+    posts = posts.filter(pub_date__gte=since).values_list(
+        'id', 'pub_date', 'author__counters__followers_count')
+    for post_id, pub_date, followers in posts.iterator():
+        scores[post_id] += post_weight(followers or 0) * _growth(
+            pub_date, now)
+    comments = comments.filter(created__gte=since).values_list(
+        'post_id', 'created')
+    for post_id, created in comments.iterator():
+        scores[post_id] += COMMENT_WEIGHT * _growth(created, now)
+    return scores
+
+
+def add_events(posts, comments, now=None):
+    """Добавляет популярность от постов и комментариев, записанных мимо
+    сигналов (например, загрузкой); возвращает число затронутых постов."""
+    now = now or timezone.now()
+    scores = _scores(posts, comments, now)
+    for post_id, score in scores.items():
+        _add(post_id, score, now)
+    return len(scores)
+
+
+def rebuild(now=None):
+    """Пересчитывает популярность с нуля по постам и комментариям.
+
+    Читаются только события за HORIZON; возвращает число постов в таблице.
+    """
+    now = now or timezone.now()
+    scores = _scores(Post.objects.all(), Comment.objects.all(), now)
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingEpoch.objects.update_or_create(
+            pk=1, defaults={'started': now})
+        TrendingScore.objects.bulk_create(
+            (
+                TrendingScore(post_id=post_id, score=score)
+                for post_id, score in scores.items() if score >= MIN_SCORE
+            ),
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+    return TrendingScore.objects.count()
@@ -0,0 +1,110 @@
+"""Потоковый приём картинок с ограничениями по размеру.
+
+Файл пишется на диск кусками по мере получения. Лимит по байтам и по
+числу пикселей проверяется на лету: пиксели считаются по заголовку
+картинки из первых килобайт, и раздутое по пикселям изображение отсекается
+до того, как его начнут декодировать. После отказа приём запроса
+прерывается StopUpload(connection_reset=True): остаток тела не читается,
+и сервер закрывает соединение. Отклонённый файл не сохраняется, а форма
+получает заглушку с текстом ошибки (см. request_files и PostForm).
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import (StopUpload,
+                                             TemporaryFileUploadHandler)
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+# Сколько начальных байт копить, чтобы прочитать размеры из заголовка
+HEADER_PROBE_BYTES = 256 * 1024
+
+
+class RejectedUpload(SimpleUploadedFile):
+    """Пустой файл на месте отклонённой загрузки с причиной отказа."""
+
+    def __init__(self, name, content_type, rejection):
+        super().__init__(name, b'', content_type)
+        self.rejection = rejection
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.rejection = None
+        self.received = 0
+        self.header = BytesIO()
+        self.size_known = False
+        if self.content_length and self.content_length > self.max_bytes:
+            self.reject_size()
+            self.abort()
+
+    @property
+    def max_bytes(self):
+        return settings.POST_IMAGE_MAX_BYTES
+
+    def reject_size(self):
+        self.rejection = (
+            f'Файл больше {filesizeformat(self.max_bytes)}.')
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.reject_size()
+        elif not self.size_known:
+            self.probe_header(raw_data)
+        if self.rejection:
+            self.abort()
+        self.file.write(raw_data)
+        return None
+
+    def abort(self):
+        """Прерывает приём запроса и кладёт заглушку для формы."""
+        self.file.close()
+        rejected = getattr(self.request, 'rejected_uploads', {})
+        rejected[self.field_name] = RejectedUpload(
+            self.file_name, self.content_type, self.rejection)
+        self.request.rejected_uploads = rejected
+        raise StopUpload(connection_reset=True)
+
+    def probe_header(self, raw_data):
+        """Читает размеры из заголовка, не декодируя саму картинку."""
+        self.header.write(raw_data)
+        self.header.seek(0)
+        try:
+            width, height = Image.open(self.header).size
+        except Image.DecompressionBombError:
+            self.reject_pixels()
+            return
+        except Exception:
+            # заголовок ещё не пришёл целиком или это не картинка:
+            # во втором случае файл отклонит проверка ImageField
+            self.size_known = (
+                self.header.getbuffer().nbytes >= HEADER_PROBE_BYTES)
+            self.header.seek(0, 2)
+            return
+        self.size_known = True
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject_pixels()
+
+    def reject_pixels(self):
+        self.rejection = (
+            f'Картинка слишком большая: допустимо не больше '
+            f'{settings.POST_IMAGE_MAX_PIXELS} пикселей.')
+
+    def file_complete(self, file_size):
+        self.header = None
+        return super().file_complete(file_size)
+
+
+def request_files(request):
+    """request.FILES вместе с заглушками загрузок, прерванных из-за лимитов."""
+    rejected = getattr(request, 'rejected_uploads', None)
+    if not rejected:
+        return request.FILES or None
+    files = request.FILES.copy()
+    for name, upload in rejected.items():
+        files[name] = upload
+    return files
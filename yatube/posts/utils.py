@@ -1,12 +1,256 @@
-from django.core.paginator import Paginator
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core.tasks import defer
+
 from .models import Post
 
 POSTS_PER_PAGE_10 = 10
+# До этого числа строк считаем точно, дальше — по кэшу или оценке
+EXACT_COUNT_LIMIT = 1000
+COUNT_CACHE_TIMEOUT = 60 * 10
+# Сколько оценка живёт в кэше, пока фоновый подсчёт её не заменит
+ESTIMATE_CACHE_TIMEOUT = 30
+PAGE_WINDOW = 2
+FEED_ORDERING = ('-pub_date', '-id')
+# post_id, а не post: сортировка по FK подставила бы ordering модели Post
+# и JOIN, и лента сортировалась бы мимо индекса
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def _split(field):
+    """Разбирает '-pub_date' на имя поля и направление сортировки."""
+    if field.startswith('-'):
+        return field[1:], True
+    return field, False
+
+
+class CursorPaginator(Paginator):
+    """Keyset-паджинатор: страница определяется не номером, а курсором.
+
+    Курсор хранит значения полей сортировки последнего (или первого)
+    объекта страницы, поэтому запрос страницы любой глубины сводится к
+    индексному WHERE ... LIMIT без OFFSET и без COUNT(*).
+    Последнее поле в ordering должно быть уникальным (обычно id).
+
+    Номер страницы условный: 1 у первой и 2 у страниц, перед которыми
+    что-то есть, а num_pages на единицу больше номера, если есть
+    следующая. Так has_next и has_previous у Page отвечают по курсорам.
+    Общее число строк неизвестно, и count бросает исключение.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        super().__init__(object_list, per_page)
+        self.ordering = ordering
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.number = 1
+
+    @property
+    def count(self):
+        raise TypeError('CursorPaginator не считает строки выборки')
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.next_cursor else self.number
+
+    def encode_cursor(self, obj, backwards=False):
+        values = []
+        for field in self.ordering:
+            name, _ = _split(field)
+            *relations, _ = name.split('__')
+            owner = obj
+            for attr in relations:
+                owner = getattr(owner, attr)
+            values.append(self._field(name).value_to_string(owner))
+        payload = json.dumps([int(backwards), values]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (values, backwards) или (None, False) для мусора."""
+        if not cursor:
+            return None, False
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            backwards, raw = json.loads(base64.urlsafe_b64decode(padded))
+            if len(raw) != len(self.ordering):
+                return None, False
+            values = [
+                self._field(_split(field)[0]).to_python(value)
+                for field, value in zip(self.ordering, raw)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            return None, False
+        return values, bool(backwards)
+
+    def _field(self, name):
+        model = self.object_list.model
+        *relations, last = name.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(last)
+
+    def _after(self, values, backwards):
+        """Q-условие «строго после курсора» в заданном направлении."""
+        condition = Q()
+        for index in reversed(range(len(self.ordering))):
+            name, descending = _split(self.ordering[index])
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            if index < len(self.ordering) - 1:
+                step |= Q(**{name: values[index]}) & condition
+            condition = step
+        return condition
+
+    def page(self, cursor):
+        values, backwards = self.decode_cursor(cursor)
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(
+                name if descending else f'-{name}'
+                for name, descending in map(_split, self.ordering)
+            )
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+        self.next_cursor = self.previous_cursor = None
+        if items:
+            if has_more or backwards:
+                self.next_cursor = self.encode_cursor(items[-1])
+            if values is not None and (has_more or not backwards):
+                self.previous_cursor = self.encode_cursor(
+                    items[0], backwards=True)
+        self.number = 2 if self.previous_cursor else 1
+        return self._get_page(items, self.number, self)
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+
+def count_cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    return f'paginator_count:{digest}'
+
+
+def estimate_count(queryset):
+    """Число строк по оценке планировщика PostgreSQL или None.
+
+    SQLite оценок строк в плане не даёт.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def refresh_count(key, queryset):
+    cache.set(key, queryset.count(), COUNT_CACHE_TIMEOUT)
+
+
+class WindowedPaginator(Paginator):
+    """Паджинатор по номерам страниц без точного COUNT(*) на больших выборках.
+
+    Выборку до EXACT_COUNT_LIMIT строк считает точно запросом с LIMIT.
+    Для большей число строк берётся из кэша; при промахе в кэш кладётся
+    оценка (или нижняя граница EXACT_COUNT_LIMIT + 1), а точное число
+    пересчитывается в фоне. Ссылки выводятся только на PAGE_WINDOW страниц
+    по обе стороны от текущей, поэтому размер навигации не зависит от
+    размера выборки.
+    """
+
+    def __init__(self, object_list, per_page, window=PAGE_WINDOW):
+        super().__init__(object_list, per_page)
+        self.window = window
+        self.page_window = range(1, 2)
+
+    @cached_property
+    def _bounded_count(self):
+        return self.object_list.order_by()[:EXACT_COUNT_LIMIT + 1].count()
+
+    @property
+    def count_is_exact(self):
+        return self._bounded_count <= EXACT_COUNT_LIMIT
+
+    @cached_property
+    def count(self):
+        if self.count_is_exact:
+            return self._bounded_count
+        queryset = self.object_list.order_by()
+        key = count_cache_key(queryset)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        estimate = max(estimate_count(queryset) or 0, self._bounded_count)
+        # оценку кладёт и пересчёт запускает только первый промахнувшийся
+        if cache.add(key, estimate, ESTIMATE_CACHE_TIMEOUT):
+            defer(refresh_count, key, queryset)
+        return cache.get(key, estimate)
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        # за оценкой числа строк могут быть ещё страницы
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не целое число')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage('На странице нет результатов')
+        # прочитанная страница уточняет приблизительное число строк
+        if (len(items) <= self.per_page
+                or self.count <= bottom + self.per_page):
+            self._set_count(bottom + len(items))
+        self.page_window = range(
+            max(1, number - self.window),
+            min(self.num_pages, number + self.window) + 1)
+        return self._get_page(items[:self.per_page], number, self)
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            if self.count_is_exact:
+                return self.page(self.num_pages)
+            return self.page(1)
+
+    def _set_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
 
 
 def paginator_page(
-        request, posts=Post.objects.select_related('group', 'author')):
-    paginator = Paginator(posts, POSTS_PER_PAGE_10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        request, posts=Post.objects.for_feed(),
+        ordering=FEED_ORDERING):
+    paginator = CursorPaginator(posts, POSTS_PER_PAGE_10, ordering)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     return page_obj
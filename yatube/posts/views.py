@@ -1,76 +1,184 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from posts.utils import paginator_page
+from core.db.routers import read_from_replica, stick_to_primary
+from core.http_cache import purge, tag_response
+from posts.cards import attach_card_versions, invalidate_post_card
+from posts.comments import (MissingPathError, order_from, reply_parent,
+                            roots_page, thread_page)
+from posts.graph import followed_authors
+from posts.images import schedule_processing
+from posts.recommendations import recommended_authors
+from posts.search import search_posts
+from posts.trending import TRENDING_ORDERING
+from posts.uploads import request_files
+from posts.utils import (POSTS_PER_PAGE_10, TIMELINE_ORDERING,
+                         WindowedPaginator, paginator_page)
 
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import (Comment, FeedItem, Follow, Group, Post, TrendingScore,
+                     User)
 
 User = get_user_model()
 
 
+def _post_tags(posts):
+    """Теги показанных постов, их авторов и групп: карточка выводит все три."""
+    tags = []
+    for post in posts:
+        tags += [f'post-{post.pk}', f'author-{post.author_id}']
+        tags += _group_tags(post.group_id)
+    return tags
+
+
+def _group_tags(*group_ids):
+    return [f'group-{group_id}' for group_id in group_ids if group_id]
+
+
+@read_from_replica
 def index(request):
-    posts = Post.objects.select_related('author', 'group')
+    posts = Post.objects.for_feed()
     page_obj = paginator_page(request, posts)
+    attach_card_versions(page_obj)
     context = {
         'page_obj': page_obj,
+        'followed_authors': followed_authors(
+            request.user, (post.author_id for post in page_obj)),
     }
-    return render(request, 'posts/index.html', context)
+    response = render(request, 'posts/index.html', context)
+    return tag_response(response, 'index', *_post_tags(page_obj))
 
 
+@read_from_replica
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.related_posts_in_group.all()
+    posts = group.related_posts_in_group.for_feed()
     page_obj = paginator_page(request, posts)
+    attach_card_versions(page_obj)
     context = {
         'posts': posts,
         'group': group,
         'page_obj': page_obj,
+        'followed_authors': followed_authors(
+            request.user, (post.author_id for post in page_obj)),
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    return tag_response(
+        response, f'group-{group.pk}', *_post_tags(page_obj))
 
 
+@read_from_replica
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.related_author_of_posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    posts = author.related_author_of_posts.for_feed()
     page_obj = paginator_page(request, posts)
+    attach_card_versions(page_obj)
+    # одна проверка идёт по индексу Follow, а не по графу процесса: граф
+    # догоняет другие процессы раз в SYNC_INTERVAL, и после редиректа из
+    # profile_follow кнопка разошлась бы с уже обновлённым счётчиком
     following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
+        user=request.user, author=author).exists()
     context = {
         'author': author,
         'posts': posts,
         'page_obj': page_obj,
         'following': following,
+        'recommended_authors': recommended_authors(request.user),
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return tag_response(
+        response, f'author-{author.pk}', *_post_tags(page_obj))
 
 
+@read_from_replica
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related(
-        'author', 'group'), id=post_id
-    )
+    post = get_object_or_404(Post.objects.for_detail(), id=post_id)
     form_comment = CommentForm()
-    comments = post.comments.all()
+    comments = roots_page(request, post.pk)
     context = {
         'post': post,
         'form_comment': form_comment,
         'comments': comments,
+        'comments_order': order_from(request),
+        'followed_authors': followed_authors(request.user, [post.author_id]),
     }
     # print('get_object_or_404(Post, pk=post_id)',
     #       get_object_or_404(Post, pk=post_id))
     # print('CommentForm()', CommentForm())
-    return render(request, 'posts/post_detail.html', context)
+    response = render(request, 'posts/post_detail.html', context)
+    return tag_response(
+        response, f'post-{post.pk}', f'author-{post.author_id}',
+        *_group_tags(post.group_id))
+
+
+@read_from_replica
+def post_comments(request, post_id):
+    # фрагмент со следующей страницей комментариев или с веткой ответов
+    thread = request.GET.get('thread')
+    if thread:
+        if not thread.isdigit():
+            raise Http404
+        parent = get_object_or_404(Comment, pk=thread, post_id=post_id)
+        try:
+            comments = thread_page(request, parent)
+        except MissingPathError:
+            raise Http404
+    else:
+        get_object_or_404(Post.objects.only('pk'), pk=post_id)
+        comments = roots_page(request, post_id)
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+        'comments_order': order_from(request),
+        'thread': thread,
+        'form_comment': CommentForm(),
+    }
+    response = render(request, 'posts/includes/comment_list.html', context)
+    return tag_response(response, f'post-{post_id}')
+
+
+@read_from_replica
+def trending(request):
+    # порядок хранится в TrendingScore: страница читается по индексу score
+    items = TrendingScore.objects.for_feed()
+    page_obj = paginator_page(request, items, TRENDING_ORDERING)
+    page_obj.object_list = attach_card_versions(
+        item.post for item in page_obj)
+    context = {
+        'page_obj': page_obj,
+        'trending': True,
+    }
+    response = render(request, 'posts/trending.html', context)
+    return tag_response(response, 'trending', *_post_tags(page_obj))
+
+
+@read_from_replica
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = WindowedPaginator(
+        search_posts(query).for_feed(), POSTS_PER_PAGE_10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    attach_card_versions(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
+@stick_to_primary
 def post_create(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(request.POST or None, files=request_files(request))
     if form.is_valid():
         form = form.save(commit=False)
         form.author = request.user
         form.save()
+        schedule_processing(form)
+        purge('index', 'trending', f'author-{form.author_id}',
+              *_group_tags(form.group_id))
         return redirect('posts:profile', form.author)
         # return redirect('posts:profile', username=request.user.username)
     return render(
@@ -80,16 +188,23 @@ def post_create(request):
 
 
 @login_required
+@stick_to_primary
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
+    old_group_id = post.group_id
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None,
+        files=request_files(request),
         instance=post)
     if form.is_valid():
-        form.save()
+        # счётчики меняются параллельно через F(), их не перезаписываем
+        form.save(commit=False).save(update_fields=form.Meta.fields)
+        if 'image' in form.changed_data:
+            schedule_processing(post)
+        invalidate_post_card(post_id)
+        purge(f'post-{post_id}', *_group_tags(old_group_id, post.group_id))
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -100,6 +215,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@stick_to_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -107,37 +223,56 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        # ответ на комментарий; поле не в CommentForm, чтобы форма
+        # оставалась из одного текста
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            try:
+                comment.parent = reply_parent(get_object_or_404(
+                    Comment, pk=parent_id, post=post))
+            except MissingPathError:
+                raise Http404
         comment.save()
+        invalidate_post_card(post_id)
+        purge(f'post-{post_id}', 'trending')
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    # информация о текущем пользователе доступна в переменной request.user
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_page(request, posts)
+    # лента материализована в FeedItem: читаем её по индексу пользователя
+    items = FeedItem.objects.for_feed(request.user)
+    page_obj = paginator_page(request, items, TIMELINE_ORDERING)
+    page_obj.object_list = attach_card_versions(
+        item.post for item in page_obj)
     context = {
         'page_obj': page_obj,
         'follow': True,
+        'recommended_authors': recommended_authors(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@stick_to_primary
 def profile_follow(request, username):
     # Подписаться на автора
     author = get_object_or_404(User, username=username)
     user = request.user
     if author != request.user:
         Follow.objects.get_or_create(user=user, author=author)
+        purge(f'author-{author.pk}')
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@stick_to_primary
 def profile_unfollow(request, username):
     # Дизлайк, отписка
     author = get_object_or_404(User, username=username)
     if author == request.user:
         return redirect('posts:profile', username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
+    purge(f'author-{author.pk}')
     return redirect('posts:profile', username=username)
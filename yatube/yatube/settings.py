@@ -35,13 +35,14 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
-    'sorl.thumbnail',
+    'api.apps.ApiConfig',
 
     # 'debug_toolbar',
     'django_extensions',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +63,7 @@ INTERNAL_IPS = [
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,13 +84,66 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# По умолчанию — SQLite в каталоге проекта. В продакшене база задаётся
+# переменными окружения YATUBE_DB_*; YATUBE_DB_POOL_SIZE включает пул
+# соединений внутри процесса (core.db.postgresql_pool), а
+# YATUBE_DB_REPLICAS — список хостов реплик только для чтения.
+DATABASE_ENGINES = {
+    'sqlite': 'core.db.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'postgresql_pool': 'core.db.postgresql_pool',
+}
+
+DB_ENGINE = os.environ.get('YATUBE_DB_ENGINE', 'sqlite')
+if os.environ.get('YATUBE_DB_POOL_SIZE') and DB_ENGINE == 'postgresql':
+    DB_ENGINE = 'postgresql_pool'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': DATABASE_ENGINES[DB_ENGINE],
+        'NAME': os.environ.get(
+            'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.environ.get('YATUBE_DB_USER', ''),
+        'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+        'HOST': os.environ.get('YATUBE_DB_HOST', ''),
+        'PORT': os.environ.get('YATUBE_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 0)),
+        'POOL_SIZE': int(os.environ.get('YATUBE_DB_POOL_SIZE', 0)),
     }
 }
 
+# Настройки соединения SQLite (core.db.sqlite3) и очередь на запись
+if DB_ENGINE == 'sqlite':
+    DATABASES['default'].update({
+        'PRAGMAS': {
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'mmap_size': 256 * 1024 * 1024,
+            # отрицательное значение — размер в КиБ, а не в страницах
+            'cache_size': -64 * 1024,
+            'busy_timeout': 5000,
+        },
+        'SERIALIZE_WRITES': True,
+    })
+
+# Реплики повторяют default, кроме хоста. В тестах каждая из них
+# зеркалит тестовую базу default; для SQLite такая же реплика «replica»
+# заведена всегда, чтобы маршрутизацию можно было проверить без сервера.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get(
+        'YATUBE_DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = dict(
+        DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica_{number}')
+if DB_ENGINE == 'sqlite':
+    DATABASES['replica'] = dict(
+        DATABASES['default'], TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает только из default
+REPLICA_STICKY_COOKIE = 'primary_sticky'
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,6 +187,15 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся на диск кусками и обрываются на превышении лимитов
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedImageUploadHandler']
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Фоновые задачи (core.tasks): миниатюры и прочая работа вне запроса
+BACKGROUND_TASKS_ASYNC = True
+BACKGROUND_WORKERS = int(os.environ.get('YATUBE_BACKGROUND_WORKERS', 2))
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -144,10 +207,61 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # Имя view-функции, обрабатывающей ошибку 403
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Кэш общий для фрагментов шаблонов, лент и сессий. Память процесса
+# годится для одного воркера; при нескольких воркерах нужен общий бэкенд,
+# иначе у каждого свой холодный кэш, а инвалидация не доходит до соседей.
+# Локально общий кэш даёт `python manage.py cache_server` (протокол memcached).
+# Бэкенды из core.cache_backends — штатные бэкенды Django, которые
+# дополнительно считают попадания и промахи для core.metrics.
+CACHE_BACKENDS = {
+    'locmem': 'core.cache_backends.LocMemCache',
+    'file': 'core.cache_backends.FileBasedCache',
+    'memcached': 'core.cache_backends.MemcachedCache',
+    'pylibmc': 'core.cache_backends.PyLibMCCache',
+}
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', ''),
+        'KEY_PREFIX': 'yatube',
     }
 }
 
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Кэш целых страниц для анонимов в обратном прокси (core.http_cache).
+# Прокси и приложение должны смотреть в один и тот же кэш: через него
+# приложение очищает сохранённые прокси ответы по тегам.
+HTTP_CACHE_ALIAS = 'default'
+HTTP_CACHE_TIMEOUT = 60 * 10
+
+# Замеры запросов (core.middleware.PerformanceMiddleware): заголовок
+# Server-Timing, метрики Prometheus на /metrics/ и журнал медленного SQL
+PERFORMANCE_SERVER_TIMING = True
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Счётчики копятся в памяти процесса. При нескольких воркерах задайте
+# общий для них каталог: процессы сбрасывают туда счётчики раз в
+# METRICS_DUMP_INTERVAL секунд, а /metrics/ их суммирует. Без каталога
+# /metrics/ показывает только процесс, ответивший на запрос.
+METRICS_MULTIPROCESS_DIR = os.environ.get('YATUBE_METRICS_DIR', '')
+METRICS_DUMP_INTERVAL = 1.0
+SLOW_QUERY_THRESHOLD_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file